@@ -1,27 +1,54 @@
 """
 Module for data abstraction
 """
+from collections import defaultdict
 from decimal import Decimal
+from functools import lru_cache
 from pathlib import Path
+import re
 from urllib.parse import urlparse
 
 from django import forms
 from django.http.request import QueryDict
 from django.utils.text import slugify
-from django.urls import resolve, reverse
+from django.urls import resolve
 
 from . import (get_registry, QUERY_FILTER, QUERY_EXCLUDE, QUERY_NEGATE,
                QUERY_SHOW, QUERY_COUNT, QUERY_SEARCH, QUERY_Q)
 from .dataset import Dataset
 from .models import Model, Q
 from .tables import table_factory, NONE_LOOKUP
-from .utils import getLogger, prep_url_query_value, url_query_value_to_python
+from .utils import (cached_reverse, getLogger, prep_url_query_value,
+                    url_query_value_to_python)
 
 
 log = getLogger(__name__)
 
 
 NO_CURATION_PREFIX = 'not-curated-'
+# matches filter and exclude query keys, the exclude key's lookup part
+# follows the exclude's index, see set_from_query()
+FILTER_EXCLUDE_KEY = re.compile(
+    rf'{QUERY_FILTER}-(?P<filter>.*)'
+    rf'|{QUERY_EXCLUDE}-(?P<index>[^-]*)-?(?P<exclude>.*)',
+    re.DOTALL,
+)
+
+
+@lru_cache(maxsize=1024)
+def filter_query_key(lookup):
+    """
+    Get the URL query key for a filter lookup
+    """
+    return slugify((QUERY_FILTER, lookup))
+
+
+@lru_cache(maxsize=1024)
+def exclude_query_key(index, lookup):
+    """
+    Get the URL query key for a lookup of the index-th exclude
+    """
+    return slugify((QUERY_EXCLUDE, index, lookup))
 
 
 class DataConfig:
@@ -42,15 +69,13 @@ class DataConfig:
     def _copy(self):
         """
         Make and return a deepish copy of instance
+
+        The copy is made without calling __init__(), all state gets copied
+        over below anyway, and setting up the fields again from the model or
+        dataset is the expensive part of making a new instance.  This matters
+        as every put() or set_name() makes a copy, e.g. for each link URL.
         """
-        if self.model._meta.model_name == self.name:
-            # create new instance from model as to not require model to be
-            # registered (a parent model)
-            obj = type(self)(self.model)
-        else:
-            # others e.g. dataset-based instances should be re-created starting
-            # with the name
-            obj = type(self)(self.name)
+        obj = object.__new__(type(self))
 
         for k, v in vars(self).items():
             if k == 'excludes':
@@ -105,18 +130,7 @@ class DataConfig:
             self._manager = getattr(self.model, dataset.manager)
         self.filter = dataset.filter
         self.excludes = dataset.excludes
-        for i in dataset.fields:
-            try:
-                name, verbose = i
-            except ValueError:
-                # assume one-tuple
-                name = i[0]
-                verbose = i[0]
-            except TypeError:
-                # assume i is str
-                name = i
-                verbose = i
-
+        for name, verbose in dataset.normalized_fields:
             self.fields.append(name)
             self.fields_verbose.append(verbose)
 
@@ -203,24 +217,36 @@ class DataConfig:
         log_msg = f'Dataconfig: get_queryset: Q: {q}'
 
         related_fields = []
+        m2m_fields = []
         for i in self.fields:
             try:
                 f = self.model.get_field(i)
             except LookupError:
                 continue
-            if f.is_relation and not f.many_to_many:
+            if f.many_to_many:
+                if f.concrete and '__' not in i:
+                    # forward m2m field, each cell lists the related objects
+                    m2m_fields.append(i)
+            elif f.is_relation:
                 related_fields.append(i)
                 for j in f.related_model.resolve_natural_lookups('natural'):
                     if '__' in j:
                         # need following relation for natural key
                         related_fields.append(
-                            i + '__' + j.rpartition('__')[0]
+                            f"{i}__{j.rpartition('__')[0]}"
                         )
             del f
 
         if related_fields:
             log_msg += f' rel:{related_fields}'
 
+        if self.avg_by:
+            # no use for prefetching with the values() rows of averages
+            m2m_fields = []
+
+        if m2m_fields:
+            log_msg += f' m2m:{m2m_fields}'
+
         if self._manager is None:
             if self.is_curated:
                 qs = self.model.curated.all()
@@ -230,6 +256,8 @@ class DataConfig:
             qs = self._manager.all()
 
         qs = qs.select_related(*related_fields).filter(q)
+        if m2m_fields:
+            qs = qs.prefetch_related(*m2m_fields)
 
         if self._need_distinct():
             qs = qs.distinct()
@@ -272,29 +300,22 @@ class DataConfig:
         """
         qlist = []
         filter = {}
-        excludes = {}
+        excludes = defaultdict(dict)
         negate = False
         extras = {}
 
         for qkey, val_list in qdict.lists():
             # TODO: error handling
-            if qkey.startswith(QUERY_FILTER + '-'):
-                _, _, filter_key = qkey.partition('-')
-                val = val_list[-1]
-                if val == NONE_LOOKUP:
-                    val = None
-                val = url_query_value_to_python(qkey, val)
-                filter[filter_key] = val
-
-            elif qkey.startswith(QUERY_EXCLUDE + '-'):
-                _, idx, exclude_key = qkey.split('-')
+            m = FILTER_EXCLUDE_KEY.match(qkey)
+            if m is not None:
                 val = val_list[-1]
                 if val == NONE_LOOKUP:
                     val = None
-                if idx not in excludes:
-                    excludes[idx] = {}
                 val = url_query_value_to_python(qkey, val)
-                excludes[idx][exclude_key] = val
+                if m['filter'] is None:
+                    excludes[m['index']][m['exclude']] = val
+                else:
+                    filter[m['filter']] = val
 
             elif qkey == QUERY_NEGATE:
                 val = val_list[-1]
@@ -316,8 +337,12 @@ class DataConfig:
             else:
                 extras[qkey] = val_list
 
-        # convert excludes into list, forget the index
-        excludes = [i for i in excludes.values()]
+        # convert excludes into list, in index order, forget the index
+        try:
+            excludes = [excludes[i] for i in sorted(excludes, key=int)]
+        except ValueError:
+            # invalid index, keep order of appearance
+            excludes = list(excludes.values())
         log.debug('DECODED QUERYSTRING:', filter, excludes, negate, extras)
 
         self.q = qlist
@@ -334,7 +359,7 @@ class DataConfig:
 
         have_filter_or_excl = False
         for k, v in self.filter.items():
-            k = slugify((QUERY_FILTER, k))
+            k = filter_query_key(k)
             if v is None:
                 v = NONE_LOOKUP
             qdict[k] = prep_url_query_value(v)
@@ -342,7 +367,7 @@ class DataConfig:
 
         for i, excl in enumerate(self.excludes):
             for k, v in excl.items():
-                k = slugify((QUERY_EXCLUDE, i, k))
+                k = exclude_query_key(i, k)
                 if v is None:
                     v = NONE_LOOKUP
                 qdict[k] = prep_url_query_value(v)
@@ -372,6 +397,35 @@ class DataConfig:
         qdict._mutable = False
         return qdict
 
+    def removal_url_queries(self):
+        """
+        Get URL query strings each with one filter or exclude removed
+
+        Returns a pair of lists, the query strings for removing each filter
+        item and those for removing each exclude.  The query dict is built only
+        once and only the removed items are deleted from a copy.  The result is
+        the same as the url_query() of remove_filter() or remove_excludes()
+        copies, except for the index numbering of excludes.
+        """
+        qdict = self.as_query_dict()
+        num_items = len(self.filter) + sum((len(i) for i in self.excludes))
+
+        def without(keys):
+            qd = qdict.copy()
+            for i in keys:
+                qd.pop(i, None)
+            if len(keys) == num_items:
+                # as in as_query_dict(): no negate without filter or exclude
+                qd.pop(QUERY_NEGATE, None)
+            return qd.urlencode(safe=',')
+
+        filter_queries = [without([filter_query_key(k)]) for k in self.filter]
+        exclude_queries = [
+            without([exclude_query_key(i, k) for k in excl])
+            for i, excl in enumerate(self.excludes)
+        ]
+        return filter_queries, exclude_queries
+
     def url_path(self):
         """
         Return url path
@@ -379,7 +433,7 @@ class DataConfig:
         kwargs = {}
 
         if self.avg_by:
-            kwargs['avg_by'] = self.avg_by
+            kwargs['avg_by'] = '-'.join(self.avg_by)
             url_name = 'average'
         else:
             url_name = 'table'
@@ -389,7 +443,7 @@ class DataConfig:
         else:
             kwargs['data_name'] = NO_CURATION_PREFIX + self.name
 
-        return reverse(url_name, kwargs=kwargs)
+        return cached_reverse(url_name, **kwargs)
 
     def url_query(self):
         """
@@ -632,12 +686,8 @@ class DataConfig:
         if isinstance(field, str):
             field = self.model.get_field(field)
 
-        ret = dict()
-        for k, v in lookups.items():
-            k = field.remote_field.name + '__' + k
-            ret[k] = v
-
-        return ret
+        prefix = f'{field.remote_field.name}__'
+        return {prefix + k: v for k, v in lookups.items()}
 
     def _need_distinct(self):
         """
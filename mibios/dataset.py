@@ -1,3 +1,4 @@
+from functools import cached_property
 from inspect import getdoc, getmembers, ismethod
 """
 Definitions for special datasets
@@ -38,6 +39,25 @@ class Dataset():
             self.fields = self.model.get_fields().names
             self.fields = [(i,) for i in self.fields]
 
+    @cached_property
+    def normalized_fields(self):
+        """
+        List of (name, verbose name) pairs for the fields
+
+        Entries in fields may be str, one-tuples or pairs.  Without a verbose
+        name, the verbose name is the field name.
+        """
+        ret = []
+        for i in self.fields:
+            if isinstance(i, str):
+                ret.append((i, i))
+            elif len(i) == 1:
+                ret.append((i[0], i[0]))
+            else:
+                name, verbose = i
+                ret.append((name, verbose))
+        return ret
+
     def get_doc(self):
         """
         Collect docstrings for dataset class and parse_FOO methods
@@ -1,7 +1,8 @@
-from collections import Counter, defaultdict
-from csv import DictReader, Sniffer
+from collections import ChainMap, Counter, OrderedDict, defaultdict
+from csv import Sniffer, reader as csv_reader
 from inspect import signature
 from io import TextIOBase, TextIOWrapper
+from itertools import islice
 import re
 import sys
 
@@ -12,6 +13,7 @@ from django.db import transaction, IntegrityError
 from . import get_registry
 from .dataset import PARSE_BLANK, UserDataError
 from .models import ImportFile, NaturalKeyLookupError
+from .signals import clear_frontpage_counts
 from .utils import DeepRecord, getLogger
 
 
@@ -31,11 +33,13 @@ class Loader():
     dataset = None
     blanks = {None: ['']}
     parse_blank = []
+    obj_cache_size = 10000  # max number of records kept in the object cache
+    chunk_size = 1000  # number of rows processed per transaction
 
     def __init__(self, data_name, sep=None, can_overwrite=True,
                  warn_on_error=False, strict_sample_id=False, dry_run=False,
                  user=None, erase_on_blank=False, no_new_records=False,
-                 note=''):
+                 note='', validate=False):
         try:
             self.dataset = get_registry().datasets[data_name]
         except KeyError:
@@ -43,6 +47,11 @@ class Loader():
         else:
             self.model = self.dataset.model
 
+        # copy class-level blank settings so that per-column additions below
+        # don't accumulate across loader instances
+        self.blanks = {k: list(v) for k, v in self.blanks.items()}
+        self.parse_blank = list(self.parse_blank)
+
         model_name = self.model._meta.model_name
         if self.dataset:
             self.accr_map = {}
@@ -72,15 +81,25 @@ class Loader():
             if 'name' not in self.accr_map and hasattr(self.model, 'name'):
                 self.accr_map['name'] = model_name + '__natural'
 
+        # reverse of accessor map, for error messages
+        self.col_names = {}
+        for col, accr in self.accr_map.items():
+            self.col_names.setdefault(accr, col)
+
         self.warnings = []
         self.sep = sep
         self.new = defaultdict(list)
         self.added = defaultdict(lambda: defaultdict(list))
-        self.changed = defaultdict(lambda: defaultdict(list))
+        # changed values as flat list of (model_name, obj, field, old, new)
+        self.changed = []
         self.erased = defaultdict(lambda: defaultdict(list))
         self.count = 0
         self.line_key = {}
-        self.fq_file_ids = set()
+        self.obj_cache = OrderedDict()
+        self.seen_rows = {}  # raw rows -> line number
+        self.parsers = {}
+        self.model_cache = {}
+        self.field_cache = {}
         self.can_overwrite = can_overwrite
         self.warn_on_error = warn_on_error
         self.strict_sample_id = strict_sample_id
@@ -89,6 +108,9 @@ class Loader():
         self.erase_on_blank = erase_on_blank
         self.no_new_records = no_new_records
         self.note = note
+        # comment for change records
+        self.comment = ' '.join(sys.argv) if user is None else ''
+        self.validate = validate
         self.file_record = None
         if dry_run:
             self.log = log
@@ -97,6 +119,36 @@ class Loader():
 
         if self.dataset:
             self.blanks[None] += self.dataset.blanks
+        # same as what Model.decode_blank() turns into blanks
+        self.blanks[None] += self.model.MISSING_DATA
+
+        # blank values/patterns per accessor, combined once for is_blank()
+        self._blanks = {None: self.compile_blanks(self.blanks[None])}
+        for i in self.accr_map.values():
+            self._blanks[i] = self.compile_blanks(
+                self.blanks[None] + self.blanks.get(i, [])
+            )
+
+    @staticmethod
+    def compile_blanks(blanks):
+        """
+        Split list of blank values into set of literals and regex patterns
+
+        Returns a tuple (literals, patterns).  Patterns compiled with the same
+        flags get joined into a single alternation pattern.
+        """
+        literals = set()
+        patterns = defaultdict(list)
+        for i in blanks:
+            if isinstance(i, re.Pattern):
+                patterns[i.flags].append(i.pattern)
+            else:
+                literals.add(i)
+        patterns = tuple((
+            re.compile('|'.join('(?:' + i + ')' for i in pats), flags)
+            for flags, pats in patterns.items()
+        ))
+        return frozenset(literals), patterns
 
     def process_header(self):
         """
@@ -105,15 +157,19 @@ class Loader():
         Helper for process_file()
         """
         self.ignored_columns = []  # columns that won't be processed
-        for i in self.reader.fieldnames:
-            if i.casefold() not in self.accr_map:
+        # column positions and accessors of columns that will be processed
+        self.columns = []
+        for pos, i in enumerate(self.fieldnames):
+            try:
+                self.columns.append((pos, self.accr_map[i.casefold()]))
+            except KeyError:
                 self.ignored_columns.append(i)
 
         log.debug('accessor map:', self.accr_map)
         log.debug('ignored fields:', self.ignored_columns)
 
-        if self.reader.fieldnames == self.ignored_columns:
-            log.debug('input fields:', self.reader.fieldnames)
+        if self.fieldnames == self.ignored_columns:
+            log.debug('input fields:', self.fieldnames)
             raise UserDataError(
                 'input file does not have any expected field/column names'
             )
@@ -122,14 +178,16 @@ class Loader():
         """
         Map file-fields to internal field names
 
-        Remove fields not in spec, set blank fields to None
+        Remove fields not in spec, set blank fields to None.  Rows shorter than
+        the header get None for the missing fields, extra fields are ignored.
         Helper for process_row()
         """
         ret = {}
-        for k, v in row.items():
+        for i, accessor in self.columns:
             try:
-                accessor = self.accr_map[k.casefold()]
-            except KeyError:
+                v = row[i]
+            except IndexError:
+                ret[accessor] = None
                 continue
             if self.is_blank(accessor, v):
                 ret[accessor] = None
@@ -139,7 +197,7 @@ class Loader():
 
     def setup_reader(self, file):
         """
-        Get the csv.DictReader all set up
+        Get the csv reader all set up and read the header
 
         Helper for process_file()
         """
@@ -165,10 +223,11 @@ class Loader():
             file.seek(0)
             log.debug('sniffed:', vars(dialect))
 
-        self.reader = DictReader(file, dialect=dialect, **reader_kwargs)
-        self.sep = self.reader.reader.dialect.delimiter  # update if unset
+        self.reader = csv_reader(file, dialect=dialect, **reader_kwargs)
+        self.sep = self.reader.dialect.delimiter  # update if unset
         log.debug('delimiter:', '<tab>' if self.sep == '\t' else self.sep)
-        log.debug('input fields:', self.reader.fieldnames)
+        self.fieldnames = next(self.reader, [])
+        log.debug('input fields:', self.fieldnames)
 
     def process_file(self, file):
         """
@@ -177,7 +236,7 @@ class Loader():
         log.debug('processing:', file, vars(file))
         self.linenum = 1
         self.last_warning = None
-        row = None
+        self.row = None
         try:
             with transaction.atomic():
                 self.file_record = ImportFile.create_from_file(
@@ -188,15 +247,21 @@ class Loader():
                 # local filesystem, ImportFile.save() we need to seek(0) our
                 # file handle.  Do uploaded files in memory do something else?
                 file.seek(0)
-                # Getting the DictReader set up must happen after saving to
+                # Getting the csv reader set up must happen after saving to
                 # disk as csv.reader takes some sort of control over the file
                 # handle and disabling tell() and seek():
                 self.setup_reader(file)
                 self.process_header()
 
-                for row in self.reader:
-                    self.process_row(row)
+                # skip empty lines (like csv.DictReader)
+                rows = (i for i in self.reader if i)
+                while True:
+                    chunk = list(islice(rows, self.chunk_size))
+                    if not chunk:
+                        break
+                    self.process_chunk(chunk)
 
+                clear_frontpage_counts()
                 if self.dry_run:
                     raise DryRunRollback
         except Exception as e:
@@ -209,17 +274,18 @@ class Loader():
                 # FIXME: needs to be reported; and (when) does this happen?
                 raise
             else:
-                if row is None:
+                if self.row is None:
                     msg = 'error at file storage or opening stage'
                 else:
-                    msg = 'Failed processing line:\n{}'.format(row)
+                    msg = 'Failed processing line {}:\n{}' \
+                          ''.format(self.linenum, self.row)
                 raise RuntimeError(msg) from e
 
         return dict(
             count=self.count,
             new=self.new,
             added=self.added,
-            changed=self.changed,
+            changed=self.changed_by_model,
             erased=self.erased,
             ignored=self.ignored_columns,
             warnings=self.warnings,
@@ -230,6 +296,18 @@ class Loader():
             file_record=self.file_record,
         )
 
+    @property
+    def changed_by_model(self):
+        """
+        Changed values grouped by model name and object
+
+        Returns a dict model name -> object -> list of (field, old, new)
+        """
+        ret = defaultdict(lambda: defaultdict(list))
+        for model_name, obj, *change in self.changed:
+            ret[model_name][obj].append(tuple(change))
+        return ret
+
     def get_from_row(self, *keys):
         """
         Get a dict with specified keys based on row
@@ -250,17 +328,15 @@ class Loader():
         Update state with object
         """
         model_name = obj._meta.model_name
-        obj.add_change_record(
-            file=self.file_record,
-            line=self.linenum,
-            user=self.user,
-            comment=' '.join(sys.argv) if self.user is None else '',
-        )
         need_to_save = False
         if is_new:
             self.new[model_name].append(obj)
             need_to_save = True
-        elif from_row is not None:
+        elif from_row is not None and any((
+            getattr(obj, k) != v for k, v in from_row.items()
+        )):
+            # only run the more expensive field-by-field compare() if any
+            # value differs at all
             consistent, diffs = obj.compare(from_row)
             for k, v in from_row.items():
                 apply_change = False
@@ -277,8 +353,8 @@ class Loader():
                     if self.erase_on_blank:
                         apply_change = True
                 elif k in diffs['mismatch']:
-                    self.changed[model_name][obj].append(
-                        (k, getattr(obj, k), from_row.get(k))
+                    self.changed.append(
+                        (model_name, obj, k, getattr(obj, k), from_row.get(k))
                     )
                     if self.can_overwrite:
                         apply_change = True
@@ -287,7 +363,7 @@ class Loader():
                     need_to_save = True
                     setattr(obj, k, v)
 
-        if need_to_save:
+        if need_to_save and self.validate:
             obj.full_clean()
 
         if is_primary_obj:
@@ -301,6 +377,12 @@ class Loader():
                 self.line_key[obj.natural] = self.linenum
 
         if need_to_save:
+            obj.add_change_record(
+                file=self.file_record,
+                line=self.linenum,
+                user=self.user,
+                comment=self.comment,
+            )
             obj.save()
 
     def is_blank(self, col_name, value):
@@ -312,25 +394,123 @@ class Loader():
 
         Values are assumed to be trimmed of whitespace already.
         """
-        for i in self.blanks[None] + self.blanks.get(col_name, []):
-            if isinstance(i, re.Pattern):
-                if i.match(value):
-                    return True
-            elif value == i:
-                return True
-        if self.model.decode_blank(value) == '':
+        try:
+            literals, patterns = self._blanks[col_name]
+        except KeyError:
+            literals, patterns = self._blanks[None]
+        if value in literals:
             return True
+        for i in patterns:
+            if i.match(value):
+                return True
         return False
 
-    def process_row(self, row):
+    def get_state(self):
+        """
+        Save the row-dependent loader state and start a new chunk
+
+        Scalar state is saved as-is.  The accumulated record stats and line
+        keys are not copied, instead fresh accumulators are set up for the
+        chunk, so this is independent of how much was loaded already.  After
+        the chunk call either merge_state() or, to roll back, set_state() with
+        the returned state.
+
+        Helper for process_chunk()
+        """
+        state = dict(
+            linenum=self.linenum,
+            count=self.count,
+            num_warnings=len(self.warnings),
+            last_warning=self.last_warning,
+            line_key=self.line_key,
+            seen_rows=self.seen_rows,
+            new=self.new,
+            added=self.added,
+            num_changed=len(self.changed),
+            erased=self.erased,
+        )
+        # lookups of line keys must still see the earlier chunks
+        self.line_key = ChainMap({}, self.line_key)
+        self.seen_rows = ChainMap({}, self.seen_rows)
+        self.new = defaultdict(list)
+        self.added = defaultdict(lambda: defaultdict(list))
+        self.erased = defaultdict(lambda: defaultdict(list))
+        return state
+
+    def merge_state(self, state):
+        """
+        Merge the chunk's accumulators into the state from get_state()
+
+        Helper for process_chunk()
+        """
+        state['line_key'].update(self.line_key.maps[0])
+        self.line_key = state['line_key']
+        state['seen_rows'].update(self.seen_rows.maps[0])
+        self.seen_rows = state['seen_rows']
+        for k, v in self.new.items():
+            state['new'][k] += v
+        self.new = state['new']
+        for name in ['added', 'erased']:
+            stats = state[name]
+            for k, v in getattr(self, name).items():
+                for obj, items in v.items():
+                    stats[k][obj] += items
+            setattr(self, name, stats)
+
+    def set_state(self, state):
+        """
+        Reset the row-dependent loader state to what get_state() returned
+
+        The chunk's accumulated stats are dropped.  Helper for process_chunk()
+        """
+        self.linenum = state['linenum']
+        self.count = state['count']
+        del self.warnings[state['num_warnings']:]
+        self.last_warning = state['last_warning']
+        self.line_key = state['line_key']
+        self.seen_rows = state['seen_rows']
+        self.new = state['new']
+        self.added = state['added']
+        del self.changed[state['num_changed']:]
+        self.erased = state['erased']
+        # cached objects may have been changed or created by rolled-back rows
+        self.obj_cache.clear()
+
+    def process_chunk(self, rows):
+        """
+        Process a number of input rows inside a single transaction
+
+        This avoids a savepoint per row.  If a row fails and errors are to be
+        turned into warnings, then the chunk is rolled back and its rows are
+        re-processed one-by-one, each inside its own savepoint.
+        """
+        state = self.get_state()
+        try:
+            with transaction.atomic():
+                for i in rows:
+                    self.process_row(i, savepoint=False)
+        except (ValidationError, IntegrityError, UserDataError):
+            if not self.warn_on_error:
+                # keep linenum and row of the failed row for the error message
+                raise
+            self.set_state(state)
+            for i in rows:
+                self.process_row(i)
+        else:
+            self.merge_state(state)
+
+    def process_row(self, row, savepoint=True):
         """
         Process a single input row
 
         This method does pre-processing and wraps the work into a transaction
         and handles some of the fallout of processing failure.  The actual work
-        is delegated to process_fields().
+        is delegated to process_fields().  Without savepoint, errors to be
+        turned into warnings are raised for process_chunk() to handle.
         """
         self.linenum += 1
+
+        key = tuple(row)
         self.row = self.pre_process_row(row)
 
         # rec: accumulates bits of processing before final assembly
@@ -338,10 +518,21 @@ class Loader():
         # backup counters
         new_ = self.new.copy()
         added_ = self.added.copy()
-        changed_ = self.changed.copy()
+        num_changed = len(self.changed)
         erased_ = self.erased.copy()
         try:
-            with transaction.atomic():
+            if key in self.seen_rows:
+                # identical rows would only result in the same records being
+                # processed again, fail early
+                raise UserDataError(
+                    f'duplicate of line {self.seen_rows[key]}'
+                )
+            self.seen_rows[key] = self.linenum
+
+            if savepoint:
+                with transaction.atomic():
+                    self.process_fields()
+            else:
                 self.process_fields()
         except (ValidationError, IntegrityError, UserDataError) as e:
             # Catch errors to be presented to the user;
@@ -364,6 +555,9 @@ class Loader():
                       ''.format(self.linenum, msg, self.row)
                 raise type(e)(msg) from e
 
+            if not savepoint:
+                raise
+
             err_name = type(e).__name__
             self.warnings.append(
                 'skipping row: at line {}: {} ({})'
@@ -391,10 +585,13 @@ class Loader():
 
             self.last_warning = (err_name, msg, self.linenum, repeats)
 
+            # objects cached during the rolled-back row may not exist anymore
+            self.obj_cache.clear()
+
             # reset stats:
             self.new = new_
             self.added = added_
-            self.changed = changed_
+            del self.changed[num_changed:]
             self.erased = erased_
         except Exception as e:
             msg = 'at line {}: {}, current row:\n{}' \
@@ -408,31 +605,47 @@ class Loader():
         loader = cls(data_name, **kwargs)
         return loader.process_file(file)
 
-    def parse_value(self, accessor, value):
+    def get_parser(self, accessor):
         """
-        Delegate to specified Dataset.parse_FOO method
+        Get the Dataset.parse_FOO method for given accessor
+
+        Returns a tuple (model prefix, parse method or None, whether the method
+        takes the record as second argument).  Results are cached.
+        Helper for parse_value()
         """
+        try:
+            return self.parsers[accessor]
+        except KeyError:
+            pass
+
         # rm model prefix from accsr to form method name
         pref, _, a = accessor.partition('__')
         parse_fun = getattr(self.dataset, 'parse_' + a, None)
+        if parse_fun is None:
+            with_rec = False
+        else:
+            with_rec = len(signature(parse_fun).parameters) == 2
+
+        self.parsers[accessor] = (pref, parse_fun, with_rec)
+        return self.parsers[accessor]
+
+    def parse_value(self, accessor, value):
+        """
+        Delegate to specified Dataset.parse_FOO method
+        """
+        pref, parse_fun, with_rec = self.get_parser(accessor)
 
         if parse_fun is None:
             ret = value
         else:
-            args = [value]
-            if len(signature(parse_fun).parameters) == 2:
-                args.append(self.rec)
-
             try:
-                ret = parse_fun(*args)
+                if with_rec:
+                    ret = parse_fun(value, self.rec)
+                else:
+                    ret = parse_fun(value)
             except Exception as e:
                 # assume parse_fun is error-free and blame user
-                for i, j in self.accr_map.items():
-                    if j == accessor:
-                        col = i
-                        break
-                else:
-                    col = '??'
+                col = self.col_names.get(accessor, '??')
                 raise UserDataError(
                     'Failed parsing value "{}" in column {}: {}:{}'
                     ''.format(value, col, type(e).__name__, e)
@@ -447,19 +660,111 @@ class Loader():
     def get_model(self, accessor):
         """
         helper to get model class from accessor
+
+        Raises LookupError if the accessor does not lead to a model.  Results
+        are cached.
+        """
+        try:
+            m = self.model_cache[accessor]
+        except KeyError:
+            m = self._get_model(accessor)
+            self.model_cache[accessor] = m
+        if m is None:
+            raise LookupError(accessor)
+        return m
+
+    def _get_model(self, accessor):
+        """
+        Uncached get_model(), returns None for non-model accessors
         """
-        name = accessor[0]
-        m = get_registry().models[name]  # may raise KeyError
+        try:
+            m = get_registry().models[accessor[0]]
+        except KeyError:
+            return None
 
         for i in accessor[1:]:
             try:
                 m = m._meta.get_field(i).related_model
-            except (FieldDoesNotExist, AttributeError) as e:
-                raise LookupError from e
+            except (FieldDoesNotExist, AttributeError):
+                return None
             if m is None:
-                raise LookupError
+                return None
         return m
 
+    def get_field(self, model, name):
+        """
+        Cached model._meta.get_field(), returns None for non-fields
+        """
+        try:
+            return self.field_cache[(model, name)]
+        except KeyError:
+            pass
+
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        self.field_cache[(model, name)] = field
+        return field
+
+    def get_object(self, model, id_arg, data):
+        """
+        Get existing object or instantiate new one
+
+        Returns a tuple (object, is_new).  Objects already retrieved or created
+        while processing earlier rows are re-used from the object cache.
+        Helper for process_fields()
+        """
+        try:
+            key = (model, tuple(sorted(id_arg.items())))
+            hash(key)
+        except TypeError:
+            # unhashable values, e.g. unsaved objects
+            key = None
+        else:
+            if key in self.obj_cache:
+                self.obj_cache.move_to_end(key)
+                return self.obj_cache[key], False
+
+        try:
+            obj = model.objects.get(**id_arg)
+        except model.DoesNotExist as e:
+            if self.no_new_records:
+                raise UserDataError('record not found') from e
+            # id_arg was used as lookup in get() above but used now for
+            # the model constructor, this works as long as the keys are
+            # limited to field or property names
+            try:
+                obj = model(**id_arg, **data)
+            except ObjectDoesNotExist as e:
+                # rel obj within natural key missing
+                raise UserDataError(f'record not found: {e}') from e
+            new = True
+        except model.MultipleObjectsReturned as e:
+            # id_arg under-specifies
+            msg = '{} is not specific enough for {}' \
+                  ''.format(id_arg, model._meta.model_name)
+            raise UserDataError(msg) from e
+        except NaturalKeyLookupError as e:
+            raise UserDataError(e) from e
+        except ValueError as e:
+            # happens for value of wrong type, e.g. non-number in an id
+            # field so int() fails, and who knows, maybe other reasons,
+            # anyways, let's blame the user for uploading bad data.
+            raise UserDataError(
+                'Possibly bad value / type not matching the field: {}:'
+                '{}'.format(type(e).__name__, e)
+            ) from e
+        else:
+            new = False
+
+        if key is not None:
+            self.obj_cache[key] = obj
+            if len(self.obj_cache) > self.obj_cache_size:
+                # evict least recently used
+                self.obj_cache.popitem(last=False)
+        return obj, new
+
     def process_fields(self):
         """
         Process a row column by column
@@ -498,7 +803,7 @@ class Loader():
                     continue
 
                 if isinstance(v, dict):
-                    data = v.copy()
+                    data = v
                     id_arg = {}
                 elif isinstance(v, model):
                     # value was instantiated by parse_value()
@@ -516,93 +821,53 @@ class Loader():
                         ''.format(data, k, v, self.rec)
                     )
 
-                # separate identifiers from other fields
-                for i in ['natural', 'id', 'name']:
-                    if i in data:
-                        id_arg[i] = data.pop(i)
-
-                # separate many_to_many fields from data
+                # Sort data into identifiers, many-to-many values and other
+                # fields in a single pass.  The latter get their str values
+                # converted to the correct python type: (a bit) like
+                # Field.to_python().  We do this here outside of the usual
+                # Model.full_clean() to get the correct values to compare them
+                # with existing objects in account() below.
+                fields = {}
                 m2ms = {}
                 for _k, _v in data.items():
-                    try:
-                        field = model._meta.get_field(_k)
-                    except FieldDoesNotExist:
+                    if _k in ('natural', 'id', 'name'):
+                        id_arg[_k] = _v
                         continue
+
+                    field = self.get_field(model, _k)
+                    if field is None:
+                        raise FieldDoesNotExist(
+                            f'{model._meta.model_name} has no field {_k}'
+                        )
+
                     if field.many_to_many:
-                        m2ms[_k] = _v
-
-                for i in m2ms:
-                    del data[i]
-                m2ms = {
-                    _k: _v for _k, _v in m2ms.items()
-                    # filter out Nones
-                    if _v is not None
-                }
-
-                # convert str field values to correct python type:
-                # (a bit) link Field.to_python()
-                # We do this here outside of the usual Model.full_clean() to
-                # get the correct values to compare them with existing objects
-                # in account() below.
-                data1 = {}
-                field = None
-                for _k, _v in data.items():
-                    field = model._meta.get_field(_k)
-                    if _v is None:
+                        # filter out Nones
+                        if _v is not None:
+                            m2ms[_k] = _v
+                    elif _v is None:
                         # ensure correct blank values
                         if field.null:
-                            data1[_k] = None
+                            fields[_k] = None
                         elif field.blank:
-                            data1[_k] = ''
+                            fields[_k] = ''
                         else:
                             # rm the field, will get default value for new objs
                             # TODO: issue a warning
                             continue
                     elif isinstance(_v, str):
                         # may raise ValidationError
-                        data1[_k] = field.to_python(_v)
+                        fields[_k] = field.to_python(_v)
                     else:
                         # non-str values are coerced already
-                        data1[_k] = _v
-                data = data1
-                del data1, field
+                        fields[_k] = _v
+                data = fields
 
                 # if we don't have unique ids, use the "data" instead
                 if not id_arg:
                     id_arg = data
                     data = {}
 
-                try:
-                    obj = model.objects.get(**id_arg)
-                except model.DoesNotExist as e:
-                    if self.no_new_records:
-                        raise UserDataError('record not found') from e
-                    # id_arg was used as lookup in get() above but used now for
-                    # the model constructor, this works as long as the keys are
-                    # limited to field or property names
-                    try:
-                        obj = model(**id_arg, **data)
-                    except ObjectDoesNotExist as e:
-                        # rel obj within natural key missing
-                        raise UserDataError(f'record not found: {e}') from e
-                    new = True
-                except model.MultipleObjectsReturned as e:
-                    # id_arg under-specifies
-                    msg = '{} is not specific enough for {}' \
-                          ''.format(id_arg, model._meta.model_name)
-                    raise UserDataError(msg) from e
-                except NaturalKeyLookupError as e:
-                    raise UserDataError(e) from e
-                except ValueError as e:
-                    # happens for value of wrong type, e.g. non-number in an id
-                    # field so int() fails, and who knows, maybe other reasons,
-                    # anyways, let's blame the user for uploading bad data.
-                    raise UserDataError(
-                        'Possibly bad value / type not matching the field: {}:'
-                        '{}'.format(type(e).__name__, e)
-                    ) from e
-                else:
-                    new = False
+                obj, new = self.get_object(model, id_arg, data)
 
                 # is this the row's primary record?
                 is_primary_obj = \
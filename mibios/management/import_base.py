@@ -91,6 +91,14 @@ class AbstractImportCommand(BaseCommand):
                  'in an error.  By default the import is aborted on any such '
                  'error.',
         )
+        parser.add_argument(
+            '--validate',
+            action='store_true',
+            help='Run full model validation on each new or changed record '
+                 'before saving it.  By default only the field values are '
+                 'converted and the database constraints are relied upon, '
+                 'which is much faster for large files.',
+        )
         parser.add_argument(
             '--debug',
             action='store_true',
@@ -115,6 +123,7 @@ class AbstractImportCommand(BaseCommand):
                 dry_run=options['dry_run'],
                 warn_on_error=options['warn_on_error'],
                 no_new_records=options['no_new_records'],
+                validate=options['validate'],
                 **self.load_file_kwargs(**options),
             )
         except UserDataError as e:
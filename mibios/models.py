@@ -1662,16 +1662,23 @@ class Model(models.Model):
 
         This returns Model._meta.related_objects whose related Model inherits
         from mibios.Model. These can meaningful participant in e.g. count
-        columns.
-        """
-        return [
-            i for i in cls.get_fields(with_m2m=True).fields
-            if i.many_to_many
-        ] + [
-            i for i in cls._meta.related_objects
-            if issubclass(i.related_model, Model)
-            and i.one_to_many  # prevents m2ms from being returned twice
-        ]
+        columns.  The list is computed once per model class, after the app
+        registry is ready.
+        """
+        # look in the class' own dict, as not to use a parent's list
+        rels = cls.__dict__.get('_related_objects_cache')
+        if rels is None:
+            rels = [
+                i for i in cls.get_fields(with_m2m=True).fields
+                if i.many_to_many
+            ] + [
+                i for i in cls._meta.related_objects
+                if issubclass(i.related_model, Model)
+                and i.one_to_many  # prevents m2ms from being returned twice
+            ]
+            if cls._meta.apps.ready:
+                cls._related_objects_cache = rels
+        return list(rels)
 
     @classmethod
     def get_related_accessors(cls):
@@ -1,5 +1,6 @@
 from django.core.cache import caches
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
@@ -8,11 +9,15 @@ from .utils import getLogger
 
 log = getLogger('mibios')
 
+# front page cache, short-lived since bulk imports don't send signals
+FRONTPAGE_COUNTS_CACHE_KEY = 'mibios:frontpage_counts'
+FRONTPAGE_CACHE_TIMEOUT = 60
 
-@receiver(post_save)
+
+@receiver([post_save, post_delete])
 def clear_cache_on_save(sender, **kwargs):
     """
-    Empty the cache when something gets saved
+    Empty the cache when something gets saved or deleted
     """
     c = caches['default']
     if not hasattr(c, '_cache'):
@@ -22,3 +27,15 @@ def clear_cache_on_save(sender, **kwargs):
     if c._cache:
         log.debug(f'cache: clearing all {len(c._cache.keys())} entries')
         c.clear()
+
+
+def clear_frontpage_counts():
+    """
+    Drop the cached front page record counts
+
+    To be called after bulk_create() / bulk_update(), which don't send any
+    post_save signal.  Inside a transaction this waits for the commit.
+    """
+    transaction.on_commit(
+        lambda: caches['default'].delete(FRONTPAGE_COUNTS_CACHE_KEY)
+    )
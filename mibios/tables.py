@@ -1,21 +1,54 @@
+from collections import OrderedDict
+from copy import deepcopy
+from functools import lru_cache
 import re
+from threading import Lock
+from urllib.parse import quote
 
-from django.db.models import DecimalField
+from django.core.exceptions import FieldError
+from django.db import DatabaseError
+from django.db.models import DecimalField, Sum
 from django.urls import reverse
 from django.utils.functional import cached_property
-from django.utils.html import format_html
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
 
 import django_tables2 as tables
 
 from .models import ChangeRecord, Snapshot
-from .utils import getLogger
+from .utils import cached_reverse, getLogger, prep_url_query_value
 
 
 log = getLogger('mibios')
 
 
 NONE_LOOKUP = 'NULL'
+URL_VALUE_PLACEHOLDER = 'MIBIOS-URL-VALUE'
 ORDER_BY_FIELD = 'sort'
+TABLE_CLASS_CACHE_SIZE = 64
+
+# cache of table_factory() generated classes, shared by request threads, so
+# access only while holding the lock
+table_classes = OrderedDict()
+table_classes_lock = Lock()
+
+
+@lru_cache(maxsize=1024)
+def dotted_accessor(lookup):
+    """
+    Get django_tables2 accessor for a django lookup
+    """
+    return tables.A(lookup.replace('__', '.'))
+
+
+def prefix_lookups(prefix, lookups):
+    """
+    Prefix the keys of a filter/exclude dict with given lookup prefix
+    """
+    if not lookups:
+        return {}
+    prefix += '__'
+    return {prefix + k: v for k, v in lookups.items()}
 
 
 class GroupColumn(tables.Column):
@@ -28,7 +61,11 @@ class GroupColumn(tables.Column):
     """
     column_header = None
 
-    def __init__(self, rel_object=None, table_conf=None, group_by=[],
+    # not modified after construction (except for the URL cache), these are
+    # shared with the copies django_tables2 makes for each table instance
+    shared_attrs = ('rel_conf', 'urls', 'all_related_conf')
+
+    def __init__(self, rel_object=None, table_conf=None, group_by=(),
                  exclude_from_export=True, verbose_name=None, **kwargs):
         """
         Reverse relation column constructor
@@ -50,24 +87,21 @@ class GroupColumn(tables.Column):
             our_name = rel_object.remote_field.name
 
         if 'linkify' not in kwargs and table_conf:
-            rel_conf = table_conf.set_name(data_name)
-
-            def linkify(record):
-                f = {}
-                for i in group_by:
-                    try:
-                        # ValuesIterable is used in QuerySet
-                        f[i] = record[i]
-                    except TypeError:
-                        # records are regular instances
-                        f[i] = getattr(record, i)
-
-                if hasattr(record, 'natural'):
-                    f[our_name] = record.natural
-
-                return rel_conf.put(filter=f).url()
-
-            kwargs.update(linkify=linkify)
+            # page, sort etc. of the current table don't apply to related data
+            rel_conf = table_conf.set_name(data_name).put(extras={})
+            self.rel_conf = rel_conf
+            # besides the strings, linkify() only uses the shared_attrs, so
+            # table copies get no state of their own (tuples are not copied)
+            self.group_by = tuple(group_by)
+            self.our_name = our_name
+            # URLs by filter items, rows of a group share a link
+            self.urls = {}
+            # rows of reverse relation columns only differ by the natural key
+            # of the record, so links can be made from a template
+            self.link_template = rel_conf.put(
+                filter={our_name: URL_VALUE_PLACEHOLDER}
+            ).url()
+            kwargs.update(linkify=self.linkify)
 
         if table_conf is not None:
             self.set_footer_url(rel_object, rel_conf, table_conf, our_name)
@@ -83,6 +117,50 @@ class GroupColumn(tables.Column):
                          empty_values=(),
                          verbose_name=verbose_name, **kwargs)
 
+    def __deepcopy__(self, memo):
+        for i in self.shared_attrs:
+            try:
+                value = getattr(self, i)
+            except AttributeError:
+                continue
+            # make deepcopy() think it has already copied the value
+            memo[id(value)] = value
+        obj = self.__class__.__new__(self.__class__)
+        memo[id(self)] = obj
+        for k, v in self.__dict__.items():
+            setattr(obj, k, deepcopy(v, memo))
+        return obj
+
+    def linkify(self, record):
+        if not self.group_by and hasattr(record, 'natural'):
+            value = record.natural
+            if value is None:
+                value = NONE_LOOKUP
+            value = quote(str(prep_url_query_value(value)), safe=',')
+            return self.link_template.replace(URL_VALUE_PLACEHOLDER, value, 1)
+
+        f = {}
+        for i in self.group_by:
+            try:
+                # ValuesIterable is used in QuerySet
+                f[i] = record[i]
+            except TypeError:
+                # records are regular instances
+                f[i] = getattr(record, i)
+
+        if hasattr(record, 'natural'):
+            f[self.our_name] = record.natural
+
+        key = tuple(f.items())
+        try:
+            return self.urls[key]
+        except KeyError:
+            url = self.urls[key] = self.rel_conf.put(filter=f).url()
+        except TypeError:
+            # unhashable values
+            url = self.rel_conf.put(filter=f).url()
+        return url
+
     def render(self, value):
         if value is None:
             return 'link'
@@ -105,25 +183,33 @@ class GroupColumn(tables.Column):
                 # child name: how we're known to the parent
                 child = \
                     rel_object.model.get_child_info()[table_conf.model].name
-                our_name = our_name + '__' + child
+                our_name = f'{our_name}__{child}'
 
-            f = {our_name + '__' + k: v for k, v in table_conf.filter.items()}
+            f = prefix_lookups(our_name, table_conf.filter)
 
             elist = []
             for i in table_conf.excludes:
-                e = {our_name + '__' + k: v for k, v in i.items()}
+                e = prefix_lookups(our_name, i)
                 if e:
                     elist.append(e)
 
             # if there is a filter selecting for us, then skip exclusion of
-            # missing data:
-            for i in f:
-                if i.startswith(our_name):
-                    break
-            else:
+            # missing data (all keys in f are prefixed with our name):
+            if not f:
                 elist.append({our_name: NONE_LOOKUP})
 
-        self.all_related_conf = rel_conf.put(filter=f, excludes=elist)
+        self.all_related_conf = rel_conf.put(filter=f, excludes=elist,
+                                             extras={})
+        # footer HTML except for the total, the URL is escaped only once here
+        url = self.all_related_conf.url()
+        self.footer_prefix = format_html('all: <a href="{}">', url)
+        self.footer_link = format_html('<a href="{}">link to all</a>', url)
+
+    def format_footer(self, total):
+        """
+        Render footer HTML with link for given total
+        """
+        return mark_safe(f'{self.footer_prefix}{escape(total)}</a>')
 
     def render_footer(self, bound_column, table):
         """
@@ -132,9 +218,8 @@ class GroupColumn(tables.Column):
         This needs to look at the whole table not just the page that is
         displayed and so needs a separate database query.
         """
-        url = self.all_related_conf.url()
         if not self.all_related_conf.with_counts:
-            return format_html('<a href="{}">link to all</a>', url)
+            return self.footer_link
 
         total = 0
         try:
@@ -143,29 +228,25 @@ class GroupColumn(tables.Column):
         except AttributeError as e:
             # raised if table.data.data is not a mibios.QuerySet
             log.debug('Failed getting count column totals optimized:', e)
-            # try the normal way, also extra database query: retrieves the
-            # whole table with annotations but the result is cached for
-            # subsequent count columns
-            for row in table.data:
-                total += bound_column.accessor.resolve(row)
+            # try summing up the column on its own
+            total = table.get_column_total(bound_column)
         except KeyError:
             # raised if the counts were not calculated in the queryset for some
             # reason
             log.debug(f'sum for count column {bound_column.accessor} missing')
             total = 'NA'
 
-        return format_html('all: <a href="{}">{}</a>', url, total)
+        return self.format_footer(total)
 
 
 class AvgGroupCountColumn(GroupColumn):
     """
     Group count column for average tables
 
-    Need a different (i.e. the old manual) way to sum the total for the footer
-    because the queryset for average tables is different.  The CountColumn way
-    causes an OperationError (syntax error at the database?) so putting this
-    into a subclass makes the manual summing regular for average tables.  The
-    disadvantage remains that the database is queried again.
+    Need a different way to sum the total for the footer because the queryset
+    for average tables is different.  The group counts are aggregates
+    themselves, so the sum is taken over the average queryset as a subquery,
+    with the old manual summing as fall-back.
     """
     def __init__(self, *args, verbose_name=None, **kwargs):
         if verbose_name is None:
@@ -173,11 +254,13 @@ class AvgGroupCountColumn(GroupColumn):
         super().__init__(*args, verbose_name=verbose_name, **kwargs)
 
     def render_footer(self, bound_column, table):
-        total = 0
-        for row in table.data:
-            total += bound_column.accessor.resolve(row)
-        url = self.all_related_conf.url()
-        return format_html(f'all: <a href="{url}">{total}</a>')
+        try:
+            total = table.avg_group_count_total
+        except (AttributeError, DatabaseError) as e:
+            # AttributeError: table.data.data is not a QuerySet
+            log.debug('Failed getting avg group count total optimized:', e)
+            total = table.get_column_total(bound_column, in_db=False)
+        return self.format_footer(total)
 
 
 class ManyToManyColumn(tables.ManyToManyColumn):
@@ -212,6 +295,48 @@ class Table(tables.Table):
         """
         return self.data.data.sum_rev_rel_counts()
 
+    @cached_property
+    def all_rows(self):
+        """
+        List of all rows of the complete, not paginated, table data
+
+        For footers that need to look at all the data, which then is retrieved
+        only once.
+        """
+        return list(self.data)
+
+    def get_column_total(self, bound_column, in_db=True):
+        """
+        Sum up a column's values over all rows
+
+        The sum is taken by the database if the data is a QuerySet, otherwise,
+        or if that fails, the sum is done in python over all rows, which are
+        then kept for subsequent columns.
+        """
+        accessor = bound_column.accessor
+        if in_db:
+            try:
+                total = self.data.data.aggregate(
+                    total=Sum(accessor.replace('.', '__'))
+                )['total']
+            except (AttributeError, DatabaseError, FieldError) as e:
+                # AttributeError: data is not a QuerySet
+                log.debug(f'Failed getting column {accessor} total in SQL:', e)
+            else:
+                return total or 0
+
+        return sum((accessor.resolve(row) for row in self.all_rows))
+
+    @cached_property
+    def avg_group_count_total(self):
+        """
+        Provide the sum of the group counts of an average table
+
+        Requires the data to be backed by an averaged QuerySet.
+        """
+        total = self.data.data.aggregate(total=Sum('avg_group_count'))['total']
+        return total or 0
+
 
 class DecimalColumn(tables.Column):
     """
@@ -247,6 +372,29 @@ class DecimalColumn(tables.Column):
         return value
 
 
+def table_conf_key(conf):
+    """
+    Get the part of a table config's state that goes into generated columns
+
+    Helper for table_factory() to make cache keys.  The query extras, e.g.
+    page or sort order, are not part of this as the columns don't use them.
+    Raises TypeError if some of the state is not hashable.
+    """
+    key = (
+        conf.name,
+        conf.is_curated,
+        conf.show_hidden,
+        conf.with_counts,
+        tuple(conf.avg_by),
+        tuple(sorted(conf.filter.items())),
+        tuple(tuple(sorted(i.items())) for i in conf.excludes),
+        conf.negate,
+        tuple(conf.q),
+    )
+    hash(key)
+    return key
+
+
 def table_factory(model=None, field_names=[], conf=None,
                   extra={}, group_by_count=None):
     """
@@ -264,6 +412,8 @@ def table_factory(model=None, field_names=[], conf=None,
     also work if no TableView is available.  In such a case at least the model
     argument is required.  If both are given, then field_names override
     TableView.fields.
+
+    Generated classes are cached, unless extra columns are given.
     """
     if model is None:
         if conf is None:
@@ -282,6 +432,21 @@ def table_factory(model=None, field_names=[], conf=None,
     else:
         verbose_field_names = conf.fields_verbose
 
+    cache_key = None
+    if conf is not None and not extra:
+        try:
+            cache_key = (model, tuple(field_names), tuple(verbose_field_names),
+                         group_by_count, table_conf_key(conf))
+        except TypeError:
+            # unhashable filter values etc., don't cache
+            pass
+        else:
+            with table_classes_lock:
+                table_class = table_classes.get(cache_key)
+                if table_class is not None:
+                    table_classes.move_to_end(cache_key)
+                    return table_class
+
     meta_opts = dict(
         model=model,
         template_name='django_tables2/bootstrap4.html',
@@ -294,6 +459,9 @@ def table_factory(model=None, field_names=[], conf=None,
     # this indicates that capitalize() should not be applied
     mid_upper_pat = re.compile(r'^..*[A-Z]')
 
+    has_name_column = 'name' in field_names
+    has_name_field = 'name' in model.get_fields().names
+
     for accessor, verbose_name in zip(field_names, verbose_field_names):
         try:
             field = model.get_field(accessor)
@@ -321,7 +489,7 @@ def table_factory(model=None, field_names=[], conf=None,
             col = accessor
         else:
             # django_tables2 wants dotted accessors
-            col = tables.A(accessor.replace('__', '.'))
+            col = dotted_accessor(accessor)
 
         meta_opts['fields'].append(col)
         col_kw = {}
@@ -330,7 +498,7 @@ def table_factory(model=None, field_names=[], conf=None,
 
         if accessor == 'name':
             col_class = tables.Column
-            if 'name' not in model.get_fields().names:
+            if not has_name_field:
                 # name is actually the natural property, so have to set
                 # some proxy sorting, else the machinery tries to fetch the
                 # 'name' column (and fails)
@@ -344,7 +512,7 @@ def table_factory(model=None, field_names=[], conf=None,
             col_class = tables.Column
             # make one of id or name columns have an edit link / hide id if
             # name is present
-            col_kw['linkify'] = 'name' not in field_names
+            col_kw['linkify'] = not has_name_column
 
         # m2m fields
         elif field is not None and field.many_to_many:
@@ -384,7 +552,7 @@ def table_factory(model=None, field_names=[], conf=None,
 
     for k, v in extra.items():
         # TODO: allow specifiying the position
-        meta_opts.append(k)
+        meta_opts['fields'].append(k)
         opts[k] = v
 
     parent = Table
@@ -392,7 +560,13 @@ def table_factory(model=None, field_names=[], conf=None,
     opts.update(Meta=Meta)
 
     name = 'Autogenerated' + model._meta.model_name.capitalize() + 'Table'
-    return type(name, (parent, ), opts)
+    table_class = type(name, (parent, ), opts)
+    if cache_key is not None:
+        with table_classes_lock:
+            table_classes[cache_key] = table_class
+            if len(table_classes) > TABLE_CLASS_CACHE_SIZE:
+                table_classes.popitem(last=False)
+    return table_class
 
 
 class HistoryTable(tables.Table):
@@ -504,14 +678,14 @@ class SnapshotTableColumn(tables.Column):
     Column that lists a snapshot's tables
     """
     def __init__(self, snapshot_name, **kwargs):
-        def linkify(record):
-            return reverse(
-                'snapshot_table',
-                kwargs=dict(
-                    name=snapshot_name,
-                    app=record['app'],
-                    table=record['table'],
-                )
-            )
-        super().__init__(self, linkify=linkify, **kwargs)
-        self.verbose_name = 'available tables'
+        self.snapshot_name = snapshot_name
+        kwargs.setdefault('verbose_name', 'available tables')
+        super().__init__(linkify=self.linkify, **kwargs)
+
+    def linkify(self, record):
+        return cached_reverse(
+            'snapshot_table',
+            name=self.snapshot_name,
+            app=record['app'],
+            table=record['table'],
+        )
@@ -1,11 +1,12 @@
+from collections.abc import Hashable
 from datetime import datetime
 from functools import partial, wraps
 from inspect import signature
-from itertools import chain, zip_longest
+from itertools import chain, islice, zip_longest
 from operator import length_hint
 import os
 from pathlib import Path
-from threading import local, Timer
+from threading import current_thread, local, Timer
 from string import Formatter
 import sys
 
@@ -101,9 +102,13 @@ class ProgressPrinter():
     After the timer has stopped, even after calling finish() the progress
     printing can be resumed by calling update() with a different state than the
     last one.
+
+    The timer is a single daemon thread, it is only replaced after it stopped
+    due to lack of progress or after finish().
     """
     DEFAULT_TEMPLATE = '{progress}'
     DEFAULT_INTERVAL = 1.0  # seconds
+    FILE_FLUSH_RINGS = 10  # flush non-terminal output every so many rings
 
     def __init__(
             self,
@@ -117,6 +122,14 @@ class ProgressPrinter():
             raise ValueError('interval must be greater than zero')
 
         self.template, self.template_var = self._init_template(template)
+        if self.template_var is None:
+            self.format_progress = self.template.format
+        else:
+            self.format_progress = partial(
+                self._format_named,
+                self.template.format,
+                self.template_var,
+            )
         self.interval = interval
         self.output_file = output_file
         self.show_rate = show_rate
@@ -124,16 +137,19 @@ class ProgressPrinter():
         self.length = length
         self.it = None
         self.timer = None
-        # start metering here, assuming inc() calls commence soon:
         self.reset_state()
-        self.timer.start()
+        # start metering here, assuming inc() calls commence soon:
+        self.start_timer()
 
     def __call__(self, it):
         self.it = it
         self.reset_length_info()
         for elem in it:
             yield elem
-            self.inc()
+            # inc() inlined, this is the hot path for wrapped iterators
+            self.current += 1
+            if self.timer is None:
+                self.start_timer()
         self.it = None
         self.finish()
 
@@ -141,14 +157,14 @@ class ProgressPrinter():
         """
         reset the variable state
 
-        Must be called before inc().  Will start the timer and progress
+        Stops the timer, the next inc() will start a new timer and progress
         metering and printing.
         """
-        self.reset_timer()
+        self.stop_timer()
         self.current = 0
-        self.last = 0
         self.at_previous_ring = None
         self.max_width = 0
+        self.ring_count = 0
         self.ring_time = None
         self.time_zero = datetime.now()
         self.reset_length_info()
@@ -174,13 +190,24 @@ class ProgressPrinter():
         else:
             self._length = self.length
 
-    def reset_timer(self):
+    def start_timer(self):
+        """ Start a new timer thread """
+        self.timer = RepeatTimer(self.interval, self._ring, owner=self)
+        self.timer.start()
+
+    def stop_timer(self):
         """
-        Initializes or resets the timer but does not start() it.
+        Stop the timer thread, if any
+
+        Waits for the timer thread to end unless called from the timer itself.
         """
-        if self.timer is not None:
-            self.timer.cancel()
-        self.timer = RepeatTimer(self.interval, self._ring, owner=self)
+        timer = self.timer
+        if timer is None:
+            return
+        self.timer = None
+        timer.cancel()
+        if timer is not current_thread() and timer.is_alive():
+            timer.join()
 
     def _init_template(self, template):
         """
@@ -208,27 +235,24 @@ class ProgressPrinter():
 
         return template, template_var
 
+    @staticmethod
+    def _format_named(fmt, var, value):
+        return fmt(**{var: value})
+
     def inc(self, step=1):
         """
         increment progress
 
-        Turn on time if needed
+        Turn on timer if needed
         """
-        if self.current == self.at_previous_ring:
-            # timer was stopped at last ring
-            try:
-                self.timer.start()
-            except RuntimeError:
-                # if the timer thread is still in reset_timer(), we can't
-                # re-start the old timer thread; pass here and start new timer
-                # at next inc()
-                pass
-
-        self.last = self.current
         self.current += step
+        if self.timer is None:
+            # timer was stopped at last ring or by finish()
+            self.start_timer()
 
     def finish(self):
         """ Stop the timer and print a final result """
+        self.stop_timer()
         total_seconds = (datetime.now() - self.time_zero).total_seconds()
         avg_txt = (f'(total: {total_seconds:.1f}s '
                    f'avg: {self.current / total_seconds:.1f}/s)')
@@ -237,17 +261,21 @@ class ProgressPrinter():
 
     def _ring(self):
         """ Print progress """
-        self.ring_time = datetime.now()
-        self.print_progress()
-
         if self.current == self.at_previous_ring:
-            # maybe we just iterate very slowly relative to the timer interval,
-            # but probably some exception occurred in the main thread; have to
-            # stop the timer or we'll get an infinite loop
+            # Nothing new to print.  Maybe we just iterate very slowly
+            # relative to the timer interval, but probably some exception
+            # occurred in the main thread; have to stop the timer or we'll get
+            # an infinite loop
             # When inc() is called again a new timer will be used.
-            self.reset_timer()
+            timer = current_thread()
+            timer.cancel()
+            if self.timer is timer:
+                self.timer = None
             return
 
+        self.ring_time = datetime.now()
+        self.ring_count += 1
+        self.print_progress()
         self.at_previous_ring = self.current
 
     def estimate(self):
@@ -286,10 +314,7 @@ class ProgressPrinter():
 
     def print_progress(self, avg_txt='', end=''):
         """ Do the progress printing """
-        if self.template_var is None:
-            txt = self.template.format(self.current)
-        else:
-            txt = self.template.format(**{self.template_var: self.current})
+        txt = self.format_progress(self.current)
 
         if avg_txt:
             # called by finish()
@@ -318,7 +343,12 @@ class ProgressPrinter():
         if self.to_terminal:
             txt = '\r' + txt
 
-        print(txt, end=end, flush=True, file=self.output_file)
+        self.output_file.write(txt + end)
+        # flushing a log file every second is a waste, do it only every few
+        # rings and for the final print
+        if self.to_terminal or end \
+                or self.ring_count % self.FILE_FLUSH_RINGS == 0:
+            self.output_file.flush()
 
 
 def grouper(iterable, n, fillvalue=None):
@@ -334,14 +364,12 @@ def grouper(iterable, n, fillvalue=None):
 def chunker(iterable, n):
     """
     Group iterable in chunks of equal size, except possibly for the last chunk
+
+    Same as itertools.batched() from Python 3.12.
     """
-    sentinel = object()
-    for grp in grouper(iterable, n, fillvalue=sentinel):
-        # grp is a n-tuple
-        if grp[-1] is sentinel:
-            yield tuple(i for i in grp if i is not sentinel)
-        else:
-            yield grp
+    it = iter(iterable)
+    while chunk := tuple(islice(it, n)):
+        yield chunk
 
 
 class InputFileSpec:
@@ -365,6 +393,17 @@ class InputFileSpec:
         self.path = None
         self.has_header = None
         self.fk_attrs = {}
+        self._row_spec = None
+
+    @property
+    def col_index(self):
+        return self._col_index
+
+    @col_index.setter
+    def col_index(self, value):
+        self._col_index = value
+        # row_data() spec must follow the column index
+        self._row_spec = None
 
     def setup(self, loader, column_specs=None, path=None):
         """
@@ -509,15 +548,16 @@ class InputFileSpec:
         """
         raise NotImplementedError
 
-    def row_data(self, row):
+    def _get_row_spec(self):
         """
-        Generate a row as tuples (field, func, value)
-
-        Blank/empty values will be set to None here.  Extra items for
-        calculated field values are added.
+        Compile what row_data() needs for each column
 
-        :param list row: A list of str
+        Returns a tuple of tuples (field, func, col_index, empty values,
+        calc value).  The column index is None for calculated fields, then the
+        calc value is what row_data() yields as value.  The empty values are a
+        frozenset merging the input file's and the field's empty values.
         """
+        spec = []
         it = zip(self.fields, self.prepfuncs, self.col_names, self.col_index)
         for field, fn, col_name, col_i in it:
             if col_name is self.CALC_VALUE:
@@ -525,15 +565,41 @@ class InputFileSpec:
                     # No method was provided in spec, so we let them skip this
                     # one and trust that this field was or will be set via some
                     # other field's processing.
-                    value = self.IGNORE_COLUMN
+                    calc_value = self.IGNORE_COLUMN
                 else:
                     # fn will calculate value
-                    value = None
+                    calc_value = None
+                spec.append((field, fn, None, None, calc_value))
+            else:
+                empty_values = frozenset((
+                    i for i in chain(self.empty_values, field.empty_values)
+                    if isinstance(i, Hashable)
+                ))
+                spec.append((field, fn, col_i, empty_values, None))
+        return tuple(spec)
+
+    def row_data(self, row):
+        """
+        Get a row as list of tuples (field, func, value)
+
+        Blank/empty values will be set to None here.  Extra items for
+        calculated field values are added.
+
+        :param list row: A list of str
+        """
+        if self._row_spec is None:
+            self._row_spec = self._get_row_spec()
+
+        data = []
+        for field, fn, col_i, empty_values, calc_value in self._row_spec:
+            if col_i is None:
+                value = calc_value
             else:
                 value = row[col_i]
-                if value in self.empty_values or value in field.empty_values:
+                if value in empty_values:
                     value = None
-            yield (field, fn, value)
+            data.append((field, fn, value))
+        return data
 
     def row2dict(self, row_data):
         """ turn result of row_data() into a dict with field names as keys """
@@ -2,11 +2,13 @@
 Utilities module
 """
 from datetime import datetime
+from functools import lru_cache
 import inspect
 import logging
 import time
 
 import django.db
+from django.urls import reverse
 
 
 logging.addLevelName(25, 'SUCCESS')
@@ -197,33 +199,47 @@ class DeepRecord():
 
         prev[i] = value
 
-    def keys(self, key=(), leaves_first=False, leaves_only=False):
+    def _items(self, key, cur, leaves_only):
         """
-        Return (sorted) list of keys
+        Recursively collect (key, value) pairs in depth-first order
+
+        Helper for items()
         """
         ret = []
-        cur = self[key]
         if isinstance(cur, dict):
             if key:
                 if not (cur and leaves_only):
-                    ret.append(key)
+                    ret.append((key, cur))
             for k, v in cur.items():
-                ret += self.keys(
-                    key + (k,),
-                    leaves_first=leaves_first,
-                    leaves_only=leaves_only,
-                )
+                ret += self._items(key + (k,), v, leaves_only)
         else:
             if key:
-                ret.append(key)
+                ret.append((key, cur))
+        return ret
 
-        if leaves_first:
-            ret = sorted(ret, key=lambda x: -len(x))
+    def keys(self, key=(), leaves_first=False, leaves_only=False):
+        """
+        Return (sorted) list of keys
+        """
+        return [
+            k for k, _ in self.items(
+                key=key,
+                leaves_first=leaves_first,
+                leaves_only=leaves_only,
+            )
+        ]
 
-        return ret
+    def items(self, key=(), leaves_first=False, leaves_only=False):
+        """
+        Return (sorted) list of (key, value) pairs
 
-    def items(self, **kwargs):
-        return [(i, self[i]) for i in self.keys(**kwargs)]
+        The tree is walked once and, if leaves_first is True, sorted once,
+        longest keys first.
+        """
+        ret = self._items(key, self[key], leaves_only)
+        if leaves_first:
+            ret.sort(key=lambda x: -len(x[0]))
+        return ret
 
     def update(self, *args, **kwargs):
         for i in args:
@@ -324,6 +340,17 @@ def url_query_value_to_python(key, value):
     return value
 
 
+@lru_cache(maxsize=512)
+def cached_reverse(viewname, **kwargs):
+    """
+    Memoized reverse() for URLs with keyword arguments
+
+    URL resolution is done only once for each distinct set of arguments.  The
+    argument values must be hashable.
+    """
+    return reverse(viewname, kwargs=kwargs)
+
+
 def get_db_connection_info():
     """
     compile a information on DB connections
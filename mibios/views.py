@@ -1,5 +1,6 @@
 from collections import OrderedDict
 import csv
+from functools import lru_cache
 from itertools import tee, zip_longest
 from math import isnan
 from zipfile import ZipFile, ZIP_DEFLATED
@@ -9,6 +10,7 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.core.management import call_command
 from django.http import Http404, HttpResponse, StreamingHttpResponse
@@ -32,6 +34,7 @@ from .forms import (ExportForm, get_field_search_form, UploadFileForm,
 from .load import Loader
 from .management.import_base import AbstractImportCommand
 from .models import ChangeRecord, ImportFile, Snapshot
+from .signals import FRONTPAGE_CACHE_TIMEOUT, FRONTPAGE_COUNTS_CACHE_KEY
 from .tables import (DeletedHistoryTable, HistoryTable,
                      CompactHistoryTable, DetailedHistoryTable,
                      SnapshotListTable, SnapshotTableColumn, Table,
@@ -46,16 +49,41 @@ class SearchFieldLookupError(LookupError):
     pass
 
 
+@lru_cache(maxsize=256)
+def _get_record_type(app_label, model_name):
+    return ContentType.objects.get_by_natural_key(app_label, model_name)
+
+
+def get_record_type(model):
+    """
+    Get the content type with which change records refer to given model
+
+    Content types are cached by (app label, model name).  Django's
+    ContentTypeManager caches too, but this skips its per-database cache
+    layers.  A missing content type raises ContentType.DoesNotExist and is
+    not cached.
+    """
+    opts = model._meta.concrete_model._meta
+    return _get_record_type(opts.app_label, opts.model_name)
+
+
 class CuratorMixin():
     CURATOR_GROUP_NAME = 'curators'
     user_is_curator = False
 
     def setup(self, request, *args, **kwargs):
-        f = dict(name=self.CURATOR_GROUP_NAME)
         try:
-            self.user_is_curator = request.user.groups.filter(**f).exists()
-        except Exception:
-            pass  # default applies
+            # result kept on the request's user from an earlier view
+            self.user_is_curator = request.user.mibios_is_curator
+        except AttributeError:
+            f = dict(name=self.CURATOR_GROUP_NAME)
+            try:
+                self.user_is_curator = \
+                    request.user.groups.filter(**f).exists()
+            except Exception:
+                pass  # default applies
+            else:
+                request.user.mibios_is_curator = self.user_is_curator
         super().setup(request, *args, **kwargs)
 
 
@@ -86,20 +114,39 @@ class BasicBaseMixin(CuratorMixin, ContextMixin):
     def get_context_data(self, **ctx):
         ctx = super().get_context_data(**ctx)
         # page_title: a list, inheriting views should consider adding to this
-        ctx['page_title'] = [getattr(
+        ctx['page_title'] = [self.get_site_title()]
+        ctx['user_is_curator'] = self.user_is_curator
+        ctx['version_info'] = self.get_version_info()
+        return ctx
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_site_title():
+        """
+        Get the first part of the page title, compiled only once
+        """
+        return getattr(
             get_registry(),
             'verbose_name',
             apps.get_app_config('mibios').verbose_name
-        )]
-        ctx['user_is_curator'] = self.user_is_curator
-        ctx['version_info'] = {'mibios': __version__}
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_version_info():
+        """
+        Get the version info for the page footer
+
+        None of this changes after startup, so it is compiled only once.
+        """
+        version_info = {'mibios': __version__}
         for conf in get_registry().apps.values():
-            ctx['version_info'][conf.name] = getattr(conf, 'version', None)
+            version_info[conf.name] = getattr(conf, 'version', None)
         if settings.DEBUG:
-            ctx['version_info']['DEBUG'] = 'True'
+            version_info['DEBUG'] = 'True'
             for db_alias, db_info in get_db_connection_info().items():
-                ctx['version_info'][f'DB {db_alias}'] = db_info
-        return ctx
+                version_info[f'DB {db_alias}'] = db_info
+        return version_info
 
     @staticmethod
     def parse_query_string_csv(get):
@@ -140,8 +187,26 @@ class BaseMixin(BasicBaseMixin):
     def get_context_data(self, **ctx):
         ctx = super().get_context_data(**ctx)
         reg = get_registry()
-        ctx['model_names'] = OrderedDict()
-        ctx['data_names'] = OrderedDict()
+        ctx['model_names'], ctx['data_names'] = self.get_nav_names()
+        ctx['snapshots_exist'] = cache.get_or_set('mibios:snapshots_exist',
+                                                  Snapshot.objects.exists,
+                                                  FRONTPAGE_CACHE_TIMEOUT)
+        ctx['site_name'] = reg.verbose_name
+        return ctx
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_nav_names():
+        """
+        Get the sorted model and dataset names per app
+
+        Returns a pair of dicts mapping app verbose names to lists of names.
+        The registry is complete once the apps are ready, so this is compiled
+        only once.
+        """
+        reg = get_registry()
+        model_names = OrderedDict()
+        data_names = OrderedDict()
 
         for app_name, app_conf in reversed(list(reg.apps.items())):
             if app_conf.name == 'mibios':
@@ -149,22 +214,18 @@ class BaseMixin(BasicBaseMixin):
             else:
                 verbose_name = app_conf.verbose_name
 
-            model_names = sorted((
+            names = sorted((
                 (i._meta.model_name, i._meta.verbose_name_plural)
                 for i in reg.get_models(app=app_conf.name)
             ))
-            if model_names:
-                ctx['model_names'][verbose_name] = model_names
+            if names:
+                model_names[verbose_name] = names
 
-            data_names = sorted(
-                get_registry().get_dataset_names(app=app_conf.name)
-            )
-            if data_names:
-                ctx['data_names'][app_conf.verbose_name] = data_names
+            names = sorted(reg.get_dataset_names(app=app_conf.name))
+            if names:
+                data_names[app_conf.verbose_name] = names
 
-        ctx['snapshots_exist'] = Snapshot.objects.exists()
-        ctx['site_name'] = reg.verbose_name
-        return ctx
+        return model_names, data_names
 
 
 class DatasetMixin(BaseMixin):
@@ -250,6 +311,19 @@ class DatasetMixin(BaseMixin):
             rels = ''
         return rels + field
 
+    @classmethod
+    @lru_cache(maxsize=None)
+    def get_avg_by_data(cls, model):
+        """
+        Get mapping from URL slug to shortened lookups for model's averages
+
+        Model.average_by is fixed, so this is computed once per model.
+        """
+        return {
+            '-'.join(i): [cls.shorten_lookup(j) for j in i]
+            for i in model.average_by
+        }
+
     def get_context_data(self, **ctx):
         ctx = super().get_context_data(**ctx)
         if self.conf is None:
@@ -264,25 +338,20 @@ class DatasetMixin(BaseMixin):
         ctx['page_title'].append(self.conf.verbose_name)
         ctx['data_name_verbose'] = self.conf.verbose_name
 
+        filter_queries, exclude_queries = self.conf.removal_url_queries()
         ctx['applied_filter'] = [
-            (k, v, self.conf.remove_filter(**{k: v}))
-            for k, v
-            in self.conf.filter.items()
-        ]
-        ctx['applied_excludes_list'] = [
-            (i, self.conf.remove_excludes(i))
-            for i
-            in self.conf.excludes
+            (k, v, query)
+            for (k, v), query
+            in zip(self.conf.filter.items(), filter_queries)
         ]
+        ctx['applied_excludes_list'] = list(zip(self.conf.excludes,
+                                                exclude_queries))
 
         # the original querystring to be appended to various URLs:
         querystr = self.conf.url_query()
         ctx['querystr'] = '?' + querystr if querystr else ''
 
-        ctx['avg_by_data'] = {
-            '-'.join(i): [self.shorten_lookup(j) for j in i]
-            for i in self.conf.model.average_by
-        }
+        ctx['avg_by_data'] = self.get_avg_by_data(self.conf.model)
 
         return ctx
 
@@ -327,6 +396,7 @@ class TableView(DatasetMixin, UserRequiredMixin, SingleTableView):
     def __init__(self, *args, **kwargs):
         self.compute_counts = False
         self.plugin = None
+        self.table = None
         super().__init__(*args, **kwargs)
 
     def setup(self, request, *args, **kwargs):
@@ -355,6 +425,34 @@ class TableView(DatasetMixin, UserRequiredMixin, SingleTableView):
         t = table_factory(conf=self.conf)
         return t
 
+    def get_table(self, **kwargs):
+        """
+        Get the table, hiding count columns of relations without any records
+
+        The table is made only once per request, e.g. the export view gets the
+        table for the context and again for the export values.
+        """
+        if self.table is None:
+            self.table = super().get_table(**kwargs)
+            if self.conf is not None and self.conf.with_counts:
+                self.hide_empty_count_columns(self.table)
+        return self.table
+
+    @staticmethod
+    def hide_empty_count_columns(table):
+        try:
+            # same query the count column footers use
+            totals = table.rev_rel_counts_totals
+        except AttributeError:
+            # data is not a mibios.QuerySet
+            return
+
+        for k, v in totals.items():
+            # strip the __sum to get the column name
+            name = k[:-len('__sum')]
+            if not v and name in table.columns:
+                table.columns.hide(name)
+
     def get_sort_by_field(self):
         """
         Returns name of valid sort-by fields from the querystring
@@ -424,13 +522,10 @@ class TableView(DatasetMixin, UserRequiredMixin, SingleTableView):
                         add_search_form = True
                     if len(stats['choice_counts']) < self.HIGH_UNIQUE_LIMIT:
                         # link display gets unwieldy at high numbers
-                        counts = {
-                            None if isinstance(k, float) and isnan(k) else k: v
-                            for k, v in
-                            stats['choice_counts'].items()
-                        }
-                        filter_link_data = [
-                            (
+                        for value, count in stats['choice_counts'].items():
+                            if isinstance(value, float) and isnan(value):
+                                value = None
+                            filter_link_data.append((
                                 # '' => None hack for blank char fields to make
                                 # dash appear
                                 None if isna(value) or value == '' else value,
@@ -439,10 +534,7 @@ class TableView(DatasetMixin, UserRequiredMixin, SingleTableView):
                                 # more complicated
                                 self.conf.add_filter(**{sort_by_field: value}),
                                 self.conf.add_exclude(**{sort_by_field: value}),  # noqa: E501
-                            )
-                            for value, count
-                            in counts.items()
-                        ]
+                            ))
                 ctx['filter_link_data'] = filter_link_data
             ctx['sort_by_stats'] = stats
 
@@ -530,23 +622,32 @@ class TableView(DatasetMixin, UserRequiredMixin, SingleTableView):
         return [(field.name + '__' if field else '') + i for i in kw.keys()]
 
 
+class Echo():
+    """
+    File-like object whose write() just returns what is written
+
+    For use with csv.writer to get each rendered row back.
+    """
+    def write(self, value):
+        return value
+
+
 class CSVRenderer():
     description = 'comma-separated text file'
     content_type = 'text/csv'
     delimiter = ','
-    streaming = False
+    streaming = True
 
     def __init__(self, response, **kwargs):
         self.response = response
 
     def render(self, values):
         """
-        Render all rows to the response
+        Set response's streaming content to the rendered rows
         """
-        writer = csv.writer(self.response, delimiter=self.delimiter,
+        writer = csv.writer(Echo(), delimiter=self.delimiter,
                             lineterminator='\n')
-        for i in values:
-            writer.writerow(i)
+        self.response.streaming_content = (writer.writerow(i) for i in values)
 
 
 class CSVTabRenderer(CSVRenderer):
@@ -657,6 +758,15 @@ class ExportMixin(ExportBaseMixin):
         """
         return get_registry().name + '_data'
 
+    def get_context_data(self, **ctx):
+        """
+        Skip the view's context
+
+        The context of the inheriting view is for the HTML page only,
+        render_to_response() below does not use it.
+        """
+        return ctx
+
     def render_to_response(self, context):
         name, suffix, Renderer = self.get_format()
 
@@ -739,6 +849,7 @@ class ImportView(DatasetMixin, CuratorRequiredMixin, FormView):
                 no_new_records=not form.cleaned_data['allow_new_records'],
                 user=self.request.user,
                 note=note,
+                validate=True,
             )
 
         except Exception as e:
@@ -832,6 +943,7 @@ class HistoryView(BaseMixin, CuratorRequiredMixin, MultiTableMixin,
             self.record_pk = self.record.pk
             self.record_natural = self.record.natural
             self.model_name = self.record._meta.model_name
+            model_class = type(self.record)
         else:
             # via other url conf, NOTE: has no current users
             try:
@@ -847,6 +959,12 @@ class HistoryView(BaseMixin, CuratorRequiredMixin, MultiTableMixin,
             except KeyError:
                 raise Http404
 
+        # saves joining the content type table below
+        try:
+            self.record_type = get_record_type(model_class)
+        except ContentType.DoesNotExist:
+            raise Http404
+
         if self.record is None:
             get_kw = {}
             if self.record_natural:
@@ -854,8 +972,15 @@ class HistoryView(BaseMixin, CuratorRequiredMixin, MultiTableMixin,
             elif self.record_pk:
                 get_kw['pk'] = self.record_pk
 
+            # join relations needed to get the record's natural key
+            related = [
+                i.rpartition('__')[0]
+                for i in model_class.resolve_natural_lookups('natural')
+                if '__' in i
+            ]
+            qs = model_class.objects.select_related(*related)
             try:
-                self.record = model_class.objects.get(**get_kw)
+                self.record = qs.get(**get_kw)
             except (model_class.DoesNotExist,
                     model_class.MultipleObjectsReturned):
                 self.record = None
@@ -877,7 +1002,7 @@ class HistoryView(BaseMixin, CuratorRequiredMixin, MultiTableMixin,
         # get lost or otherwise extra
         reg_pks = (i.pk for i in regular)
         f = dict(
-            record_type__model=self.model_name,
+            record_type=self.record_type,
         )
         if self.record_natural:
             f['record_natural'] = self.record_natural
@@ -885,6 +1010,7 @@ class HistoryView(BaseMixin, CuratorRequiredMixin, MultiTableMixin,
             f['record_pk'] = self.record_pk
 
         extra = ChangeRecord.objects.exclude(pk__in=reg_pks).filter(**f)
+        extra = extra.select_related('user', 'file')
         if extra.exists():
             tables.append(self.table_class(self._add_diffs(extra)))
         return tables
@@ -938,10 +1064,7 @@ class DeletedHistoryView(BaseMixin, CuratorRequiredMixin, SingleTableView):
         try:
             # record_type: can't name this content_type, that's taken in
             # TemplateResponseMixin
-            self.record_type = ContentType.objects.get_by_natural_key(
-                model._meta.app_label,
-                model._meta.model_name,
-            )
+            self.record_type = get_record_type(model)
         except ContentType.DoesNotExist:
             raise Http404
 
@@ -951,7 +1074,9 @@ class DeletedHistoryView(BaseMixin, CuratorRequiredMixin, SingleTableView):
                 is_deleted=True,
                 record_type=self.record_type,
             )
-            self.object_list = ChangeRecord.objects.filter(**f)
+            # record_type is needed for each row's link
+            self.object_list = ChangeRecord.objects.filter(**f) \
+                .select_related('user', 'record_type')
 
         return self.object_list
 
@@ -995,7 +1120,21 @@ class FrontPageView(BaseMixin, UserRequiredMixin, SingleTableMixin,
 
     def get_context_data(self, **ctx):
         ctx = super().get_context_data(**ctx)
-        ctx['counts'] = {}
+        ctx['counts'], ctx['have_changes'] = \
+            cache.get_or_set(FRONTPAGE_COUNTS_CACHE_KEY, self.get_counts,
+                             FRONTPAGE_CACHE_TIMEOUT)
+        ctx['admins'] = settings.ADMINS
+        return ctx
+
+    @staticmethod
+    def get_counts():
+        """
+        Get record counts per model and whether there is any change history
+
+        The result gets cached, in the same way the pages are, this is shared
+        by all users.
+        """
+        counts = {}
         models = get_registry().get_models()
 
         def sort_key(m):
@@ -1003,11 +1142,9 @@ class FrontPageView(BaseMixin, UserRequiredMixin, SingleTableMixin,
 
         for i in sorted(models, key=sort_key):
             count = i.objects.count()
-            ctx['counts'][i._meta.verbose_name_plural.capitalize()] = count
+            counts[i._meta.verbose_name_plural.capitalize()] = count
 
-        ctx['have_changes'] = ChangeRecord.objects.exists()
-        ctx['admins'] = settings.ADMINS
-        return ctx
+        return counts, ChangeRecord.objects.exists()
 
 
 class SnapshotListView(BasicBaseMixin, UserRequiredMixin, SingleTableView):
@@ -1024,20 +1161,28 @@ class SnapshotView(BasicBaseMixin, UserRequiredMixin, SingleTableView):
     """
     template_name = 'mibios/snapshot.html'
 
-    def get_table_class(self):
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def make_table_class(snapshot_name):
+        """
+        Make table class listing given snapshot's tables, cached
+        """
         meta_opts = dict(
             # model=self.model,
             # template_name='django_tables2/bootstrap.html',
         )
         Meta = type('Meta', (object,), meta_opts)
         table_opts = dict(Meta=Meta)
-        table_opts.update(table=SnapshotTableColumn(self.snapshot.name))
-        name = ''.join(self.snapshot.name.split()).capitalize()
+        table_opts.update(table=SnapshotTableColumn(snapshot_name))
+        name = ''.join(snapshot_name.split()).capitalize()
         name += 'SnapshotTable'
         # FIXME: call django_tables2.table_factory??
         klass = type(name, (Table,), table_opts)
         return klass
 
+    def get_table_class(self):
+        return self.make_table_class(self.snapshot.name)
+
     def get(self, request, *args, **kwargs):
         try:
             self.snapshot = Snapshot.objects.get(name=kwargs['name'])
@@ -1050,6 +1195,23 @@ class SnapshotView(BasicBaseMixin, UserRequiredMixin, SingleTableView):
         return self.snapshot.get_table_name_data()
 
 
+class SnapshotRow():
+    """
+    Read-only mapping view of a snapshot table row
+
+    Rows share the column index, so this takes up less memory than a dict per
+    row.
+    """
+    __slots__ = ('row', 'index')
+
+    def __init__(self, row, index):
+        self.row = row
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.row[self.index[key]]
+
+
 class SnapshotTableView(BasicBaseMixin, UserRequiredMixin, SingleTableView):
     """
     Display one table from a snapshot (with all data)
@@ -1072,22 +1234,33 @@ class SnapshotTableView(BasicBaseMixin, UserRequiredMixin, SingleTableView):
             # invalid table name
             raise Http404
 
-        self.queryset = [dict(zip(self.columns, i)) for i in rows]
+        index = {col: pos for pos, col in enumerate(self.columns)}
+        self.queryset = [SnapshotRow(i, index) for i in rows]
 
         return super().get(request, *args, **kwargs)
 
-    def get_table_class(self):
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def make_table_class(snapshot_name, columns):
+        """
+        Make table class for given snapshot table columns, cached
+
+        A snapshot's tables don't change, so the class can be re-used.
+        """
         meta_opts = dict()
         Meta = type('Meta', (object,), meta_opts)
         table_opts = dict(Meta=Meta)
-        for i in self.columns:
+        for i in columns:
             table_opts.update(**{i: Column()})
-        name = ''.join(self.snapshot.name.split()).capitalize()
+        name = ''.join(snapshot_name.split()).capitalize()
         name += 'SnapshotTableTable'
         # FIXME: call django_tables2.table_factory??
         klass = type(name, (Table,), table_opts)
         return klass
 
+    def get_table_class(self):
+        return self.make_table_class(self.snapshot.name, tuple(self.columns))
+
 
 class ExportSnapshotTableView(ExportMixin, SnapshotTableView):
     def get_filename(self):
@@ -1,22 +1,37 @@
 from collections import OrderedDict
-from itertools import chain, groupby
+from itertools import chain, groupby, islice
 from operator import attrgetter, itemgetter
+import os
+import re
 
-from Bio import SeqIO
+from Bio.SeqIO.FastaIO import SimpleFastaParser
 from django.db import models
 from django.db.transaction import atomic
-from pandas import DataFrame
+import numpy as np
+from pandas import Categorical, DataFrame, Index
+try:
+    import pyfastx
+except ImportError:
+    # optional, C-accelerated fasta parsing
+    pyfastx = None
 
 from omics.shared import MothurShared
 from mibios.dataset import UserDataError
 from mibios.models import (ImportFile, Manager, CurationManager, Model,
                            ParentModel, QuerySet, TagNote)
+from mibios.signals import clear_frontpage_counts
 from mibios.utils import getLogger
 
 
 log = getLogger(__name__)
 
 
+# max number of objects per INSERT/UPDATE for bulk operations
+BULK_CREATE_BATCH_SIZE = int(
+    os.environ.get('MIBIOS_BULK_CREATE_BATCH_SIZE', 1000)
+)
+
+
 class Sample(ParentModel):
     """
     Parent model for samples
@@ -41,6 +56,8 @@ class Sequencing(Model):
         (PLATE, PLATE),
         (OTHER, OTHER),
     )
+    # choices recognized by parse_control(), anything else maps to OTHER
+    CONTROL_KEYWORDS = (MOCK, WATER, BLANK, PLATE)
     name = models.CharField(max_length=100, unique=True)
     sample = models.ForeignKey(Sample, on_delete=models.SET_NULL,
                                blank=True, null=True)
@@ -75,13 +92,12 @@ class Sequencing(Model):
         Coerce text into available control choices
         """
         choice = txt.strip().lower()
-        if choice:
-            for i in (j[0] for j in cls.CONTROL_CHOICES):
-                if i in choice:
-                    return i
-            return cls.OTHER
-        else:
+        if not choice:
             return ''
+        for i in cls.CONTROL_KEYWORDS:
+            if i in choice:
+                return i
+        return cls.OTHER
 
 
 class SequencingRun(Model):
@@ -230,36 +246,83 @@ class AbundanceQuerySet(QuerySet):
 
         Returns a pandas DataFrame.  Assumes, that the QuerySet is filtered to
         counts from a single analysis project but this is not checked.  If the
-        assumption is violated, then the pivot operation will probably raise a:
+        assumption is violated, then this will probably raise a:
 
             "ValueError: Index contains duplicate entries, cannot reshape"
 
         Missing counts are inserted as zero, mirroring the skipping of zeros at
-        import.
+        import.  Counts without a sample or OTU label are left out.  The table
+        is filled from the category codes of the sample and OTU columns, so no
+        NaN-padded float pivot is made.
 
         DEPRECATED (and possibly incorrect)
         """
-        df = (
-            self
-            .as_dataframe('otu', 'sequencing', 'count', natural=True)
-            .pivot(index='sequencing', columns='otu', values='count')
+        df = self.as_dataframe('otu', 'sequencing', 'count', natural=True)
+        if df.duplicated(['sequencing', 'otu']).any():
+            raise ValueError('Index contains duplicate entries, cannot '
+                             'reshape')
+        rows = Categorical(df['sequencing'])
+        cols = Categorical(df['otu'])
+        # missing labels get code -1, which would index the last row/column
+        labeled = (rows.codes != -1) & (cols.codes != -1)
+        counts = np.zeros(
+            (len(rows.categories), len(cols.categories)),
+            dtype=int,
+        )
+        counts[rows.codes[labeled], cols.codes[labeled]] = \
+            df['count'].to_numpy()[labeled]
+        return DataFrame(
+            counts,
+            index=Index(rows.categories, name='sequencing'),
+            columns=Index(cols.categories, name='otu'),
         )
-        df.fillna(value=0, inplace=True)  # pivot introduced NaNs
-        return df
 
     def as_shared_values_list_old(self):
         """
-        Make mothur-shared table (slow, memory intense version)
+        Make mothur-shared table (old version)
 
         Returns an iterator over tuple rows, first row is the header.  This is
-        intended to support data export.
+        intended to support data export.  Rows are generated one sample at a
+        time, so, unlike as_shared(), the whole table is never kept in memory.
+        Otherwise the same rules apply: counts without a sample label are left
+        out and duplicate counts raise ValueError, here only once the row is
+        reached.
 
         DEPRECATED (and possibly incorrect)
         """
-        sh = self.as_shared()
-        header = ['Group'] + list(sh.columns)
-        recs = sh.itertuples(index=True, name=None)
-        return chain([header], recs)
+        # OTU columns, ordered by name, as as_shared() does, OTUs of the same
+        # name share a column
+        otus = {
+            i.pk: i.natural
+            for i in OTU.objects.filter(pk__in=self.values('otu')).iterator()
+        }
+        names = sorted(set(otus.values()))
+        header = ['Group'] + names
+        num_cols = len(names)
+        name_idx = {name: idx for idx, name in enumerate(names)}
+        col_idx = {pk: name_idx[name] for pk, name in otus.items()}
+        del otus, names, name_idx
+
+        it = (
+            self.order_by('sequencing__name')
+            .values_list('sequencing__name', 'otu', 'count')
+            .iterator()
+        )
+
+        def rows():
+            for name, group in groupby(it, key=itemgetter(0)):
+                if name is None:
+                    continue
+                row = [None] * num_cols
+                for _, otu_pk, count in group:
+                    idx = col_idx[otu_pk]
+                    if row[idx] is not None:
+                        raise ValueError('Index contains duplicate entries, '
+                                         'cannot reshape')
+                    row[idx] = count
+                yield (name, *(0 if i is None else i for i in row))
+
+        return chain([header], rows())
 
     @classmethod
     def _normalize(cls, group, size, debug=0):
@@ -752,30 +815,49 @@ class Abundance(Model):
         return super().__str__() + f' |{self.count}|'
 
     @classmethod
-    def from_file(cls, file, project, fasta=None, threads=1):
+    def from_file(cls, file, project, fasta=None, threads=1, resume=False):
         """
         Load abundance data from shared file
 
         :param file fasta: Fasta file object
         :param str otu_type: A valid OTU type.
+        :param bool resume: Resume a failed import, counts already present are
+                            skipped.
 
         If a fasta file is given, then the input does not need to use proper
         ASV numbers.  Instead ASVs are identified by sequence and ASV objects
         are created as needed.  Obviously, the OTU/ASV/sequence names in shared
         and fasta files must correspond.
+
+        The abundance data is committed in batches of BULK_CREATE_BATCH_SIZE
+        records, each in its own transaction, to keep transactions small.  If
+        the import fails part-way, then what was saved so far, including new
+        OTUs, stays in the database.  Running the same import again with
+        resume=True will complete it.  Without resume, counts that are already
+        in the database are an error.  The import file record is only made
+        after all counts are saved.
+
+        The returned count is the number of abundance records actually added.
         """
         sh = MothurShared(file, verbose=False, threads=threads)
-        return cls._from_file(file, project, fasta, sh)
+        try:
+            return cls._from_file(file, project, fasta, sh, resume=resume)
+        finally:
+            # also after failure, as batches may have been committed
+            clear_frontpage_counts()
 
     @classmethod
-    @atomic
-    def _from_file(cls, file, project, fasta, sh):
+    def _from_file(cls, file, project, fasta, sh, resume=False):
         if fasta:
             fasta_result = OTU.from_fasta(fasta, project=project)
         else:
             fasta_result = None
-        AbundanceImportFile.create_from_file(file=file, project=project)
-        sequencings = Sequencing.objects.in_bulk(field_name='name')
+        count_before = cls.objects.filter(project=project).count()
+        # only get the samples actually present in the shared file
+        sequencings = Sequencing.objects.in_bulk(
+            list(sh.counts.index),
+            field_name='name',
+        )
         if project.otu_type == AnalysisProject.ASV_TYPE:
             f = dict(project=None)
         else:
@@ -786,50 +868,88 @@ class Abundance(Model):
         }
         del f
 
-        skipped, zeros, otus_new = 0, 0, 0
         objs = []
-        for (seqid, otu), count in sh.counts.stack().items():
-            if count == 0:
-                # don't store zeros
-                zeros += 1
-                continue
 
-            if seqid not in sequencings:
-                # ok to skip, e.g. non-public
-                skipped += 1
-                continue
-
-            try:
-                otu_key = OTU.natural_lookup(otu)
-            except ValueError:
-                raise UserDataError(
-                    f'Irregular OTU identifier not supported: {otu}'
-                )
+        # work on the non-zero cells of the count matrix only, resolving
+        # row/column labels once per label instead of once per cell
+        mat = sh.counts.to_numpy()
+        rows, cols = mat.nonzero()
+        zeros = mat.size - rows.size  # don't store zeros
+        seq_objs = [sequencings.get(i) for i in sh.counts.index]
+        # drop cells of unknown samples, ok to skip, e.g. non-public
+        known = np.array([i is not None for i in seq_objs], dtype=bool)
+        keep = known[rows]
+        skipped = rows.size - int(keep.sum())
+        rows, cols = rows[keep], cols[keep]
+        del known, keep
+
+        # resolve OTU labels up front, reporting all irregular ones at once
+        otu_keys = []
+        irregular = []
+        for i in sh.counts.columns:
+            m = OTU.natural_pat.fullmatch(str(i))
+            if m is None:
+                irregular.append(str(i))
             else:
-                otu_key = (otu_key['prefix'], otu_key['number'])
-
-            try:
-                otu_obj = otus[otu_key]
-            except KeyError:
-                otu_obj = OTU.objects.create(
-                    prefix=otu_key[0],
-                    number=otu_key[1],
-                    project=project,
-                )
-                otus[otu_key] = otu_obj
-                otus_new += 1
+                otu_keys.append((m[1], int(m[2])))
+        if irregular:
+            raise UserDataError(
+                f'Irregular OTU identifier(s) not supported: '
+                f'{", ".join(irregular)}'
+            )
+        del irregular
+
+        # create missing OTUs, of the columns with counts to be saved, all
+        # together before any counts; a resumed import will find them
+        otus_new = 0
+        with atomic():
+            for col in np.unique(cols).tolist():
+                otu_key = otu_keys[col]
+                if otu_key not in otus:
+                    otus[otu_key] = OTU.objects.create(
+                        prefix=otu_key[0],
+                        number=otu_key[1],
+                        project=project,
+                    )
+                    otus_new += 1
+        otu_objs = [otus.get(i) for i in otu_keys]
 
+        for row, col, count in zip(rows.tolist(), cols.tolist(),
+                                   mat[rows, cols].tolist()):
             objs.append(cls(
                 count=count,
                 project=project,
-                sequencing=sequencings[seqid],
-                otu=otu_obj,
+                sequencing=seq_objs[row],
+                otu=otu_objs[col],
             ))
+            if len(objs) >= BULK_CREATE_BATCH_SIZE:
+                # flush to keep memory use bounded
+                cls._save_batch(objs, resume=resume)
+                objs = []
 
-        cls.objects.bulk_create(objs)
-        return dict(count=len(objs), zeros=zeros, skipped=skipped,
+        cls._save_batch(objs, resume=resume)
+        AbundanceImportFile.create_from_file(file=file, project=project)
+        count = cls.objects.filter(project=project).count() - count_before
+        return dict(count=count, zeros=zeros, skipped=skipped,
                     fasta=fasta_result, otus_created=otus_new)
 
+    @classmethod
+    def _save_batch(cls, objs, resume=False):
+        """
+        Save a batch of new abundance records in a transaction of its own
+
+        :param bool resume: If True, then records conflicting with existing
+                            ones, e.g. from an earlier partial import, are
+                            ignored.  Otherwise conflicts raise an
+                            IntegrityError.
+        """
+        with atomic():
+            cls.objects.bulk_create(
+                objs,
+                batch_size=BULK_CREATE_BATCH_SIZE,
+                ignore_conflicts=resume,
+            )
+
     @classmethod
     def compute_relative(cls, project=None):
         """
@@ -989,6 +1109,8 @@ class OTUQuerySet(QuerySet):
 
 class OTU(Model):
     NUM_WIDTH = 5
+    # prefix and trailing number of a natural name, e.g. ASV00023
+    natural_pat = re.compile(r'(.*?)(\d+)')
 
     prefix = models.CharField(max_length=8)
     number = models.PositiveIntegerField()
@@ -1084,7 +1206,24 @@ class OTU(Model):
         added, updated, skipped, total = 0, 0, 0, 0
         seq_added = 0
 
-        # passing the filehandle to SeqIO.parse: The SeqIO fasta parser tries
+        if project and project.otu_type == project.ASV_TYPE:
+            # ASVs do not belong to a project
+            project = None
+
+        # existing sequences are fetched as we go, see _prefetch_sequences()
+        seqs = {}
+        otus = {
+            (i.prefix, i.number): i
+            for i in cls.objects.filter(project=project).iterator()
+        }
+
+        try:
+            path = file_rec.file.path
+        except NotImplementedError:
+            # storage is not on the local filesystem
+            path = None
+
+        # passing the filehandle to SimpleFastaParser: The fasta parser tries
         # to skip over comments and empty lines at the begin of the file by
         # iterating over the passed file handle.  After the first line with '>'
         # is found, the line is kept and then it breaks out of the for loop and
@@ -1094,19 +1233,21 @@ class OTU(Model):
         # and it gets messy.  This is why we pass the underlying file object
         # and hope this won't blow up when something about the file storage
         # changes.
-        for i in SeqIO.parse(file_rec.file.file.file, 'fasta'):
+        records = cls._fasta_records(file_rec.file.file.file, path=path)
+
+        for seq_id, seq_str in cls._prefetch_sequences(records, seqs):
             try:  # expect {'prefix': X, 'number': N}
-                kwnum = cls.natural_lookup(i.id)
+                kwnum = cls.natural_lookup(seq_id)
             except ValueError:
-                # SeqIO sequence id does not parse,
+                # sequence id does not parse,
                 # is something from analysis pipeline, no OTU number?
                 skipped += 1
                 continue
 
             try:
-                seq = Sequence.objects.get(seq=i.seq)
-            except Sequence.DoesNotExist:
-                seq = Sequence(seq=i.seq)
+                seq = seqs[seq_str]
+            except KeyError:
+                seq = Sequence(seq=seq_str)
                 seq.full_clean()
                 seq.add_change_record(
                     file=file_rec,
@@ -1114,30 +1255,29 @@ class OTU(Model):
                     comment=comment,
                 )
                 seq.save()
+                seqs[seq_str] = seq
                 seq_added += 1
 
-            if project and project.otu_type == project.ASV_TYPE:
-                # ASVs do not belong to a project
-                project = None
-
-            obj_kw = dict(
-                prefix=kwnum['prefix'],
-                number=kwnum['number'],
-                project=project,
-            )
+            otu_key = (kwnum['prefix'], kwnum['number'])
             has_changed = False
             try:
-                obj = cls.objects.get(**obj_kw)
-            except cls.DoesNotExist:
-                obj = cls(sequence=seq, **obj_kw)
+                obj = otus[otu_key]
+            except KeyError:
+                obj = cls(
+                    sequence=seq,
+                    prefix=otu_key[0],
+                    number=otu_key[1],
+                    project=project,
+                )
+                otus[otu_key] = obj
                 added += 1
                 has_changed = True
             else:
-                if obj.sequence is None:
+                if obj.sequence_id is None:
                     obj.sequence = seq
                     updated += 1
                     has_changed = True
-                elif obj.sequence != seq:
+                elif obj.sequence_id != seq.pk:
                     raise UserDataError(f'OTU record already exists with'
                                         f'different sequence: {obj}')
 
@@ -1146,7 +1286,7 @@ class OTU(Model):
                     obj.full_clean()
                 except Exception as e:
                     log.error('Failed importing ASV: at fasta record '
-                              f'{total + 1}: {i}: {e}')
+                              f'{total + 1}: {seq_id}: {e}')
                     raise
 
                 obj.add_change_record(
@@ -1158,9 +1298,44 @@ class OTU(Model):
 
             total += 1
 
+        clear_frontpage_counts()
         return dict(total=total, new=added, updated=updated,
                     skipped=skipped)
 
+    @staticmethod
+    def _fasta_records(file, path=None):
+        """
+        Get (id, sequence) pairs from fasta file
+
+        :param file: Open file handle
+        :param str path: Path to the same file.  If given and pyfastx is
+                         installed, then pyfastx reads the file, otherwise
+                         SimpleFastaParser reads the file handle.  Either way
+                         we don't build a SeqRecord per record.
+        """
+        if pyfastx is None or path is None:
+            return (
+                (title.split(None, 1)[0] if title else title, seq)
+                for title, seq in SimpleFastaParser(file)
+            )
+        else:
+            return pyfastx.Fasta(path, build_index=False)
+
+    @staticmethod
+    def _prefetch_sequences(records, seqs):
+        """
+        Pass through fasta records, adding their known sequences to seqs
+
+        Helper for _from_fasta().  Sequences are looked up one query per batch
+        of BULK_CREATE_BATCH_SIZE records.
+        """
+        records = iter(records)
+        while batch := list(islice(records, BULK_CREATE_BATCH_SIZE)):
+            new = {seq for _, seq in batch}.difference(seqs)
+            qs = Sequence.objects.filter(seq__in=new).only('pk', 'seq')
+            seqs.update((i.seq, i) for i in qs.iterator())
+            yield from batch
+
     @classmethod
     def summary(cls, project=None):
         """
@@ -1241,18 +1416,23 @@ class Taxonomy(Model):
         database.
         """
         file_rec = ImportFile.create_from_file(file=file)
+        # only need the keys and the sequence's taxon id
         otus = {
             (i.prefix, i.number): i
-            for i in OTU.objects.filter(project=project)
+            for i in (OTU.objects.filter(project=project)
+                      .select_related('sequence')
+                      .only('prefix', 'number', 'sequence__taxon')
+                      .iterator())
         }
-        is_header = True  # first line is header
         updated, total, seq_missing = 0, 0, 0
-        seqs = []
-        for line in file_rec.file.open('r'):
-            if is_header:
-                is_header = False
-                continue
-
+        natural_match = OTU.natural_pat.fullmatch
+        # first pass: parse file, collect OTU keys and taxa with the line
+        # number of their first occurrence
+        rows = []
+        taxa_lines = {}
+        lines = iter(file_rec.file.open('r'))
+        next(lines, None)  # skip header
+        for line in lines:
             try:
                 total += 1
                 row = line.rstrip('\n').split('\t')
@@ -1263,41 +1443,56 @@ class Taxonomy(Model):
                     taxid = lctaxid
 
                 taxid = int(taxid)
-                match = OTU.natural_lookup(otu)
-                prefix = match['prefix']
-                num = match['number']
-                del match
+                match = natural_match(otu)
+                if match is None:
+                    raise ValueError(f'irregular OTU identifier: {otu}')
+                otu_key = (match[1], int(match[2]))
 
-                if (prefix, num) not in otus:
+                if otu_key not in otus:
                     # ASV/OTU not in database
                     continue
 
-                try:
-                    taxon = cls.objects.get(taxid=taxid, name=name)
-                except cls.DoesNotExist:
-                    taxon = cls(taxid=taxid, name=name)
-                    taxon.full_clean()
-                    taxon.add_change_record(
-                        file=file_rec,
-                        line=total + 1,
-                        comment=comment,
-                    )
-                    taxon.save()
-
-                seq = otus[(prefix, num)].sequence
-                if seq is None:
-                    seq_missing += 1
-                else:
-                    if seq.taxon != taxon:
-                        seq.taxon = taxon
-                        updated += 1
-                seqs.append(seq)
+                rows.append((otu_key, (taxid, name)))
+                taxa_lines.setdefault((taxid, name), total + 1)
             except Exception as e:
                 raise RuntimeError(
                     f'error loading file: {file} at line {total}: {row}'
                 ) from e
 
-        Sequence.objects.bulk_update(seqs, ['taxon'])
+        # get existing taxa in one query, only new ones get saved one by one
+        taxids = set(taxid for taxid, _ in taxa_lines)
+        taxa = {
+            (i.taxid, i.name): i
+            for i in cls.objects.filter(taxid__in=taxids).iterator()
+        }
+        for (taxid, name), lineno in taxa_lines.items():
+            if (taxid, name) in taxa:
+                continue
+            taxon = cls(taxid=taxid, name=name)
+            taxon.full_clean()
+            taxon.add_change_record(
+                file=file_rec,
+                line=lineno,
+                comment=comment,
+            )
+            taxon.save()
+            taxa[(taxid, name)] = taxon
+
+        seqs = []
+        for otu_key, taxon_key in rows:
+            seq = otus[otu_key].sequence
+            if seq is None:
+                seq_missing += 1
+                continue
+            taxon = taxa[taxon_key]
+            if seq.taxon_id != taxon.pk:
+                seq.taxon = taxon
+                updated += 1
+                seqs.append(seq)
+
+        Sequence.objects.bulk_update(seqs, ['taxon'],
+                                     batch_size=BULK_CREATE_BATCH_SIZE)
+        clear_frontpage_counts()
         return dict(total=total, update=updated, seq_missing=seq_missing)
 
 
@@ -0,0 +1,100 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import skipIf
+
+from django.test import SimpleTestCase, TestCase
+
+from .models import (Abundance, AnalysisProject, OTU, Sequencing,
+                     pyfastx)
+
+
+class FastaRecordsTests(SimpleTestCase):
+    FASTA = (
+        '>ASV0001 some comment\n'
+        'ACGTACGT\n'
+        'ACGT\n'
+        '>ASV0002\n'
+        'TTGCA\n'
+        '>Otu003\tsize=7\n'
+        'GGGG\n'
+    )
+
+    def setUp(self):
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = Path(tmpdir.name) / 'test.fa'
+        self.path.write_text(self.FASTA)
+
+    def get_records(self, path=None):
+        with self.path.open() as file:
+            return list(OTU._fasta_records(file, path=path))
+
+    def test_simple_parser(self):
+        self.assertEqual(
+            self.get_records(),
+            [('ASV0001', 'ACGTACGTACGT'), ('ASV0002', 'TTGCA'),
+             ('Otu003', 'GGGG')],
+        )
+
+    @skipIf(pyfastx is None, 'pyfastx is not installed')
+    def test_pyfastx_same_as_simple_parser(self):
+        self.assertEqual(
+            [tuple(i) for i in self.get_records(path=str(self.path))],
+            self.get_records(),
+        )
+
+
+class SharedTableTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = AnalysisProject.objects.create(
+            name='proj_a',
+            otu_type=AnalysisProject.PCT97_TYPE,
+        )
+        otus = [
+            OTU.objects.create(prefix='Otu', number=i, project=cls.project)
+            for i in (2, 1, 3)
+        ]
+        samples = [
+            Sequencing.objects.create(name=i) for i in ('s2', 's1', 's3')
+        ]
+        for otu, sample, count in [
+            (0, 0, 5), (1, 0, 3), (1, 1, 7), (2, 1, 1), (0, 2, 2),
+        ]:
+            Abundance.objects.create(
+                otu=otus[otu],
+                sequencing=samples[sample],
+                project=cls.project,
+                count=count,
+            )
+        cls.otus = otus
+        cls.samples = samples
+
+    def as_rows(self, df):
+        return [['Group', *df.columns]] + [
+            (name, *row) for name, row in zip(df.index, df.values.tolist())
+        ]
+
+    def test_old_exporter_same_as_dataframe(self):
+        qs = Abundance.objects.all()
+        self.assertEqual(
+            list(qs.as_shared_values_list_old()),
+            self.as_rows(qs.as_shared()),
+        )
+
+    def test_duplicates_raise(self):
+        other = AnalysisProject.objects.create(
+            name='proj_b',
+            otu_type=AnalysisProject.PCT97_TYPE,
+        )
+        Abundance.objects.create(
+            otu=self.otus[0],
+            sequencing=self.samples[0],
+            project=other,
+            count=1,
+        )
+        qs = Abundance.objects.all()
+        with self.assertRaises(ValueError):
+            qs.as_shared()
+        with self.assertRaises(ValueError):
+            list(qs.as_shared_values_list_old())